@@ -1,36 +1,143 @@
+import re
 import uuid
 import asyncio
+import itertools
+import orjson
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from langchain.schema import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from langchain.tools import BaseTool
 from langchain.agents import AgentExecutor
 from langchain.memory import ConversationBufferMemory
 
 from models import Agent, AgentStatus, Message
 from llm_client import LocalLLMClient
+from semantic_cache import SemanticLLMCache, SemanticSearchCache
 from gitlab_client import gitlab_client
 from c4_diagram_generator import C4DiagramGenerator
 from code_analyzer import CodeAnalyzer
 from config import settings
 
 
+# Lexical fast path for tool selection:
+# (tool name, intent, pattern, argument filled from the quoted name in the request)
+_TOOL_PATTERNS = [
+    ("gitlab_list_repositories", "repository_listing",
+     re.compile(r"\b(list|show)\b.*\brepo(?:s|sitor(?:y|ies))?\b|(покажи|список).*репозитори", re.IGNORECASE),
+     None),
+    ("gitlab_analyze_repository", "architecture_analysis",
+     re.compile(r"\banaly[sz]e\b.*\brepo(?:s|sitor(?:y|ies))?\b|проанализируй.*репозитори", re.IGNORECASE),
+     "repo_id"),
+    ("c4_create_diagram", "diagram_creation",
+     re.compile(r"\b(create|generate|build)\b.*\bdiagram|(создай|построй).*диаграмм", re.IGNORECASE),
+     "system_name"),
+    ("c4_drill_down", "diagram_navigation",
+     re.compile(r"\bdrill[ -]?down\b|детали компонента", re.IGNORECASE),
+     "element_id"),
+    ("find_code_references", "code_search",
+     re.compile(r"\bfind\b.*\b(references?|usages?|mentions?)\b|найди.*(упоминани|ссылк)", re.IGNORECASE),
+     "search_term"),
+]
+_QUOTED_RE = re.compile(r'["«“]([^"»”]+)["»”]')
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+# Kept constant so the backend can reuse the cached prompt prefix across turns
+SYSTEM_PROMPT = """You are an architecture assistant that helps engineers understand \
+microservice architectures, C4 diagrams and code.
+
+Based on the user request and tool results, generate a comprehensive response that:
+1. Addresses the user's request
+2. References relevant tool results
+3. Provides actionable insights
+4. Suggests next steps if appropriate"""
+
+# Prompt skeletons built once; only the per-turn values are formatted in
+_ANALYSIS_PROMPT_TMPL = """
+        Analyze the following user request and determine what tools are needed:
+
+        User request: {content}
+
+        Available tools:
+        - gitlab_list_repositories: List GitLab repositories
+        - gitlab_analyze_repository: Analyze repository structure
+        - gitlab_search_code: Search code in repositories
+        - c4_create_diagram: Create C4 architecture diagram
+        - c4_drill_down: Navigate to lower C4 levels
+        - c4_highlight_elements: Highlight elements in diagram
+        - code_analysis: Analyze code structure
+        - find_code_references: Find code references
+
+        Return a JSON object with:
+        - required_tools: List of tool names needed
+        - tool_args: Object mapping each required tool name to its arguments
+        - intent: User's intent (architecture_analysis, code_search, diagram_navigation, etc.)
+        - priority: High/Medium/Low
+        """
+
+_RESPONSE_PROMPT_TMPL = """
+        User request: {content}
+
+        Tool results: {tool_results}
+
+        Context: {context}
+        """
+
+
+def _match_tools(message: str) -> Optional[Dict[str, Any]]:
+    """Select tools by keywords, returning None when the request is ambiguous"""
+    quoted = _QUOTED_RE.search(message)
+    argument = quoted.group(1) if quoted else None
+    
+    matches = [rule for rule in _TOOL_PATTERNS if rule[2].search(message)]
+    if not matches:
+        return None
+    
+    # A single quoted name can only be attributed to one tool
+    needs_argument = [rule for rule in matches if rule[3]]
+    if len(needs_argument) > 1 or (needs_argument and argument is None):
+        return None
+    
+    return {
+        "required_tools": [tool for tool, _, _, _ in matches],
+        "tool_args": {tool: {arg_name: argument} for tool, _, _, arg_name in needs_argument},
+        "intent": matches[0][1],
+        "priority": "medium"
+    }
+
+
+def _extract_json(text: str) -> Dict[str, Any]:
+    """Parse the first JSON object in text, ignoring code fences and prose"""
+    return orjson.loads(_JSON_OBJECT_RE.search(text).group(0))
+
+
+def _estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough token count of chat messages (~4 characters per token)"""
+    return sum(len(msg.content) for msg in messages) // 4
+
+
 class ArchitectureAgent:
-    def __init__(self, agent_id: str, name: str):
+    def __init__(self, agent_id: str, name: str, llm_client: LocalLLMClient = None,
+                 c4_generator: C4DiagramGenerator = None, code_analyzer: CodeAnalyzer = None):
         self.agent_id = agent_id
         self.name = name
         self.status = AgentStatus.IDLE
         self.created_at = datetime.now()
         self.last_activity = datetime.now()
+        # Open websocket connections; an agent in use is never evicted
+        self.connections = 0
         
-        # Initialize components
-        self.llm_client = LocalLLMClient()
-        self.c4_generator = C4DiagramGenerator()
-        self.code_analyzer = CodeAnalyzer()
+        # Initialize components (stateless clients may be shared between agents)
+        self.llm_client = llm_client or LocalLLMClient()
+        self.llm_cache = SemanticLLMCache(self.llm_client)
+        self.code_search_cache = SemanticSearchCache(self.llm_client)
+        self.c4_generator = c4_generator or C4DiagramGenerator()
+        # Serializes diagram changes with renders running on executor threads
+        self.diagram_lock = asyncio.Lock()
+        self.code_analyzer = code_analyzer or CodeAnalyzer()
         
         # Memory and context
+        self._compaction: Optional[asyncio.Task] = None
         self.memory = ConversationBufferMemory(
             memory_key="chat_history",
             return_messages=True
@@ -80,7 +187,7 @@ class ArchitectureAgent:
         
         # Add nodes
         workflow.add_node("analyze_request", self._analyze_request_node)
-        workflow.add_node("execute_tools", ToolNode(self.tools))
+        workflow.add_node("execute_tools", self._execute_tools_node)
         workflow.add_node("generate_response", self._generate_response_node)
         
         # Add edges
@@ -95,35 +202,28 @@ class ArchitectureAgent:
         """Analyze user request and determine required tools"""
         user_message = state.get("messages", [])[-1]
         
-        # Use LLM to analyze request and determine tools needed
-        analysis_prompt = f"""
-        Analyze the following user request and determine what tools are needed:
-        
-        User request: {user_message.content}
-        
-        Available tools:
-        - gitlab_list_repositories: List GitLab repositories
-        - gitlab_analyze_repository: Analyze repository structure
-        - gitlab_search_code: Search code in repositories
-        - c4_create_diagram: Create C4 architecture diagram
-        - c4_drill_down: Navigate to lower C4 levels
-        - c4_highlight_elements: Highlight elements in diagram
-        - code_analysis: Analyze code structure
-        - find_code_references: Find code references
+        # Obvious requests skip the LLM round-trip entirely
+        analysis = _match_tools(user_message.content)
+        if analysis:
+            state["tool_analysis"] = analysis
+            return state
         
-        Return a JSON object with:
-        - required_tools: List of tool names needed
-        - intent: User's intent (architecture_analysis, code_search, diagram_navigation, etc.)
-        - priority: High/Medium/Low
-        """
+        # Use LLM to analyze request and determine tools needed
+        analysis_prompt = _ANALYSIS_PROMPT_TMPL.format(content=user_message.content)
         
-        analysis_response = self.llm_client.generate(analysis_prompt)
+        # The answer carries tool_args taken from the request text, so a merely
+        # similar request (another repo id, say) must not reuse it: exact tier only
+        analysis_response = await self.llm_cache.agenerate(
+            analysis_prompt,
+            namespace=(self.agent_id, "analyze_request"),
+            use_cache=state.get("use_cache", True),
+            semantic=False
+        )
         
         try:
-            import json
-            analysis = json.loads(analysis_response)
+            analysis = _extract_json(analysis_response)
             state["tool_analysis"] = analysis
-        except:
+        except (orjson.JSONDecodeError, AttributeError):
             state["tool_analysis"] = {
                 "required_tools": [],
                 "intent": "general",
@@ -132,29 +232,59 @@ class ArchitectureAgent:
         
         return state
     
-    async def _generate_response_node(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate final response to user"""
-        messages = state.get("messages", [])
-        tool_results = state.get("tool_results", [])
+    async def _execute_tools_node(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Run all tools selected for this turn concurrently"""
+        tool_analysis = state.get("tool_analysis", {})
+        tool_args = tool_analysis.get("tool_args") or {}
+        tools_by_name = {tool.name: tool for tool in self.tools}
+        selected = [
+            tools_by_name[name]
+            for name in dict.fromkeys(tool_analysis.get("required_tools", []))
+            if name in tools_by_name
+        ]
         
-        # Generate response using LLM
-        response_prompt = f"""
-        Based on the user request and tool results, generate a comprehensive response.
+        # Tools are independent and network/LLM-bound, so fan them out
+        semaphore = asyncio.Semaphore(settings.max_tool_concurrency)
         
-        User request: {messages[-1].content}
+        async def run_tool(tool: BaseTool) -> str:
+            async with semaphore:
+                return await tool._arun(**tool_args.get(tool.name, {}))
         
-        Tool results: {tool_results}
+        results = await asyncio.gather(
+            *[run_tool(tool) for tool in selected],
+            return_exceptions=True
+        )
         
-        Context: {self.context}
+        tool_results = {}
+        for tool, result in zip(selected, results):
+            if isinstance(result, Exception):
+                result = f"Error running {tool.name}: {str(result)}"
+            tool_results[tool.name] = result
         
-        Generate a helpful response that:
-        1. Addresses the user's request
-        2. References relevant tool results
-        3. Provides actionable insights
-        4. Suggests next steps if appropriate
-        """
+        state["tool_results"] = tool_results
+        return state
+    
+    async def _generate_response_node(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate final response to user"""
+        messages = state.get("messages", [])
+        tool_results = state.get("tool_results", {})
+        tool_args = state.get("tool_analysis", {}).get("tool_args") or {}
+        
+        # Static instructions go in the system prompt; only this turn's data goes here
+        response_prompt = _RESPONSE_PROMPT_TMPL.format(
+            content=messages[-1].content,
+            tool_results=tool_results,
+            context=self._relevant_context(tool_args)
+        )
         
-        response = self.llm_client.generate(response_prompt)
+        response = await self.llm_cache.agenerate(
+            response_prompt,
+            namespace=(self.agent_id, "generate_response"),
+            system_prompt=SYSTEM_PROMPT,
+            use_cache=state.get("use_cache", True),
+            # Prompts differing only in a name or id embed almost identically
+            semantic=False
+        )
         
         # Add response to state
         state["response"] = response
@@ -169,16 +299,23 @@ class ArchitectureAgent:
             # Add message to memory
             self.memory.chat_memory.add_user_message(message)
             
+            chat_history = self.memory.chat_memory.messages
+            
             # Execute workflow
             result = await self.executor.ainvoke({
                 "messages": [HumanMessage(content=message)],
-                "chat_history": self.memory.chat_memory.messages
+                "chat_history": chat_history,
+                # Answers in long conversations depend on history the cache key does not see
+                "use_cache": len(chat_history) <= settings.semantic_cache_max_history
             })
             
             response = result.get("response", "I'm sorry, I couldn't process your request.")
             
             # Add response to memory
             self.memory.chat_memory.add_ai_message(response)
+            # Summarizing is a full LLM round trip; keep it off the response path
+            if self._compaction is None or self._compaction.done():
+                self._compaction = asyncio.create_task(self._compact_memory())
             
             self.status = AgentStatus.IDLE
             return response
@@ -187,6 +324,48 @@ class ArchitectureAgent:
             self.status = AgentStatus.ERROR
             return f"Error processing message: {str(e)}"
     
+    def _relevant_context(self, tool_args: Dict[str, Any]) -> Dict[str, Any]:
+        """Pick the context records referenced by this turn's tool calls"""
+        referenced = {
+            value
+            for args in tool_args.values() if isinstance(args, dict)
+            for value in args.values() if isinstance(value, str)
+        }
+        analysis_results = self.context["analysis_results"]
+        
+        return {
+            "current_diagram": self.context["current_diagram"],
+            "analysis_results": {
+                repo_id: analysis_results[repo_id]
+                for repo_id in referenced if repo_id in analysis_results
+            }
+        }
+    
+    async def _compact_memory(self):
+        """Fold older turns into a running summary once over the token budget"""
+        messages = self.memory.chat_memory.messages
+        keep = max(settings.memory_keep_messages, 1)
+        if len(messages) <= keep or _estimate_tokens(messages) <= settings.memory_token_budget:
+            return
+        
+        older, recent = messages[:-keep], messages[-keep:]
+        # Summarizing cannot bring the history under budget; it would rerun every turn
+        if _estimate_tokens(recent) > settings.memory_token_budget:
+            return
+        
+        transcript = "\n".join(f"{msg.type}: {msg.content}" for msg in older)
+        summary = await self.llm_client.agenerate(
+            "Summarize the conversation below. Keep facts about repositories, "
+            "diagrams, components and decisions made.\n\n" + transcript
+        )
+        if summary.startswith("Error:"):
+            return
+        
+        # Turns added while summarizing follow the summarized prefix
+        self.memory.chat_memory.messages = [
+            SystemMessage(content=f"Summary of earlier conversation: {summary}")
+        ] + self.memory.chat_memory.messages[len(older):]
+    
     def get_context(self) -> Dict[str, Any]:
         """Get current agent context"""
         return {
@@ -206,17 +385,30 @@ class ArchitectureAgent:
 
 class AgentManager:
     def __init__(self):
+        # In creation order, which is also the order list_agents() reports
         self.agents: Dict[str, ArchitectureAgent] = {}
         self.max_agents = settings.max_agents
+        # Bumped whenever list_agents() output may change, for HTTP caching
+        self.version = 0
+        
+        # Shared by all agents to reuse connection pools and the LLM batcher
+        self.llm_client = LocalLLMClient()
+        self.code_analyzer = CodeAnalyzer()
     
     def create_agent(self, name: str) -> str:
         """Create new agent"""
-        if len(self.agents) >= self.max_agents:
+        if len(self.agents) >= self.max_agents and not self._evict_idle_agent():
             raise ValueError(f"Maximum number of agents ({self.max_agents}) reached")
         
         agent_id = str(uuid.uuid4())
-        agent = ArchitectureAgent(agent_id, name)
+        agent = ArchitectureAgent(
+            agent_id,
+            name,
+            llm_client=self.llm_client,
+            code_analyzer=self.code_analyzer
+        )
         self.agents[agent_id] = agent
+        self.version += 1
         
         return agent_id
     
@@ -224,6 +416,54 @@ class AgentManager:
         """Get agent by ID"""
         return self.agents.get(agent_id)
     
+    def attach_connection(self, agent_id: str):
+        """Pin agent while a websocket is connected to it"""
+        agent = self.agents.get(agent_id)
+        if agent:
+            agent.connections += 1
+    
+    def detach_connection(self, agent_id: str):
+        """Release a pin taken by attach_connection"""
+        agent = self.agents.get(agent_id)
+        if agent and agent.connections:
+            agent.connections -= 1
+    
+    def _is_expired(self, agent: ArchitectureAgent, now: datetime) -> bool:
+        """Check whether agent is unused and has been idle longer than the TTL"""
+        return (
+            agent.connections == 0
+            and agent.status != AgentStatus.BUSY
+            and (now - agent.last_activity).total_seconds() > settings.agent_idle_ttl
+        )
+    
+    def _evict_idle_agent(self) -> bool:
+        """Evict the least recently used expired agent"""
+        now = datetime.now()
+        expired = [agent for agent in self.agents.values() if self._is_expired(agent, now)]
+        if not expired:
+            return False
+        
+        lru = min(expired, key=lambda agent: agent.last_activity)
+        del self.agents[lru.agent_id]
+        self.version += 1
+        return True
+    
+    def evict_idle_agents(self) -> int:
+        """Evict all expired agents"""
+        now = datetime.now()
+        expired = [agent_id for agent_id, agent in self.agents.items() if self._is_expired(agent, now)]
+        for agent_id in expired:
+            del self.agents[agent_id]
+        if expired:
+            self.version += 1
+        return len(expired)
+    
+    async def run_idle_sweeper(self):
+        """Periodically evict expired agents"""
+        while True:
+            await asyncio.sleep(settings.agent_sweep_interval)
+            self.evict_idle_agents()
+    
     def list_agents(self) -> List[Dict[str, Any]]:
         """List all agents"""
         return [
@@ -241,6 +481,7 @@ class AgentManager:
         """Delete agent"""
         if agent_id in self.agents:
             del self.agents[agent_id]
+            self.version += 1
             return True
         return False
     
@@ -250,7 +491,12 @@ class AgentManager:
         if not agent:
             raise ValueError(f"Agent {agent_id} not found")
         
-        return await agent.process_message(message)
+        # Status and last activity change at both ends of processing
+        self.version += 1
+        try:
+            return await agent.process_message(message)
+        finally:
+            self.version += 1
 
 
 # Tool implementations
@@ -264,7 +510,6 @@ class GitLabListRepositoriesTool(BaseTool):
     
     async def _arun(self, query: str = "") -> str:
         try:
-            await gitlab_client.connect()
             repositories = await gitlab_client.list_repositories()
             self.agent.context["repositories"] = repositories
             return f"Found {len(repositories)} repositories: {[repo['name'] for repo in repositories]}"
@@ -299,7 +544,9 @@ class GitLabSearchCodeTool(BaseTool):
     
     async def _arun(self, repo_id: str, query: str) -> str:
         try:
-            results = await gitlab_client.search_code(repo_id, query)
+            results = await self.agent.code_search_cache.search(
+                repo_id, query, lambda: gitlab_client.search_code(repo_id, query)
+            )
             return f"Found {len(results)} code matches for '{query}'"
         except Exception as e:
             return f"Error searching code: {str(e)}"
@@ -315,7 +562,8 @@ class C4CreateDiagramTool(BaseTool):
     
     async def _arun(self, system_name: str, description: str = "") -> str:
         try:
-            diagram = self.agent.c4_generator.create_context_diagram(system_name, description)
+            async with self.agent.diagram_lock:
+                diagram = self.agent.c4_generator.create_context_diagram(system_name, description)
             self.agent.context["current_diagram"] = diagram.id
             return f"Created C4 context diagram for {system_name}"
         except Exception as e:
@@ -332,7 +580,8 @@ class C4DrillDownTool(BaseTool):
     
     async def _arun(self, element_id: str) -> str:
         try:
-            diagram = self.agent.c4_generator.drill_down(element_id)
+            async with self.agent.diagram_lock:
+                diagram = self.agent.c4_generator.drill_down(element_id)
             if diagram:
                 self.agent.context["current_diagram"] = diagram.id
                 return f"Drilled down to {diagram.name}"
@@ -387,10 +636,14 @@ class FindCodeReferencesTool(BaseTool):
     
     async def _arun(self, search_term: str) -> str:
         try:
-            references = []
-            for repo_id, analysis in self.agent.context["analysis_results"].items():
-                repo_refs = self.agent.code_analyzer.find_code_references(analysis, search_term)
-                references.extend(repo_refs)
+            # Search each analyzed repository in parallel on the default executor
+            loop = asyncio.get_running_loop()
+            analyses = list(self.agent.context["analysis_results"].values())
+            repo_refs = await asyncio.gather(*[
+                loop.run_in_executor(None, self.agent.code_analyzer.find_code_references, analysis, search_term)
+                for analysis in analyses
+            ])
+            references = list(itertools.chain.from_iterable(repo_refs))
             return f"Found {len(references)} references for '{search_term}'"
         except Exception as e:
             return f"Error finding references: {str(e)}"
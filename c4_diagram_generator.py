@@ -1,16 +1,39 @@
 import json
 import uuid
-from typing import Dict, Any, List, Optional
+import functools
+import itertools
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+import numpy as np
+import orjson
 import plotly.graph_objects as go
 import plotly.express as px
 from models import C4Element, C4Diagram, C4Level
 
 
+@functools.lru_cache(maxsize=64)
+def _circle_layout(num_elements: int, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Node coordinates evenly spaced on a circle (shared, read-only arrays)"""
+    angles = 2 * np.pi * np.arange(num_elements) / num_elements
+    x = radius * np.cos(angles)
+    y = radius * np.sin(angles)
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return x, y
+
+
+def _dot_escape(value: str) -> str:
+    """Escape a value for use inside a quoted DOT string"""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
 class C4DiagramGenerator:
     def __init__(self):
         self.diagrams = {}
         self.elements = {}
+        self._diagrams_by_root = {}  # root element id -> diagram id
+        self._version = {}  # diagram id -> bumped on every change, for render caches
+        self._element_names = {}  # diagram id -> (version, element names)
         
     def create_context_diagram(self, system_name: str, description: str = "") -> C4Diagram:
         """Create C4 Context diagram"""
@@ -40,6 +63,8 @@ class C4DiagramGenerator:
         )
         
         self.diagrams[diagram_id] = diagram
+        self._diagrams_by_root[system_element.id] = diagram_id
+        self._bump_version(diagram_id)
         self.elements[system_element.id] = system_element
         
         return diagram
@@ -99,6 +124,8 @@ class C4DiagramGenerator:
         )
         
         self.diagrams[diagram_id] = diagram
+        self._diagrams_by_root[system_id] = diagram_id
+        self._bump_version(diagram_id)
         return diagram
     
     def create_component_diagram(self, container_id: str, components: List[Dict[str, Any]]) -> C4Diagram:
@@ -156,6 +183,8 @@ class C4DiagramGenerator:
         )
         
         self.diagrams[diagram_id] = diagram
+        self._diagrams_by_root[container_id] = diagram_id
+        self._bump_version(diagram_id)
         return diagram
     
     def add_relationship(self, diagram_id: str, from_element: str, to_element: str, 
@@ -175,17 +204,38 @@ class C4DiagramGenerator:
         
         diagram.relationships.append(relationship)
         diagram.updated_at = datetime.now()
+        self._bump_version(diagram_id)
         return True
     
+    def diagram_version(self, diagram_id: str) -> int:
+        """Version of diagram, changed whenever the diagram is modified"""
+        return self._version.get(diagram_id, 0)
+    
+    def element_names(self, diagram_id: str) -> Tuple[str, ...]:
+        """Names of diagram elements, recomputed only after the diagram changes"""
+        version = self.diagram_version(diagram_id)
+        cached = self._element_names.get(diagram_id)
+        if cached is None or cached[0] != version:
+            diagram = self.diagrams.get(diagram_id)
+            names = tuple(element.name for element in diagram.elements) if diagram else ()
+            cached = (version, names)
+            self._element_names[diagram_id] = cached
+        return cached[1]
+    
+    def _bump_version(self, diagram_id: str):
+        """Mark diagram as modified"""
+        self._version[diagram_id] = self._version.get(diagram_id, 0) + 1
+    
     def highlight_elements(self, diagram_id: str, element_ids: List[str]) -> Dict[str, Any]:
         """Highlight specific elements in diagram"""
         diagram = self.diagrams.get(diagram_id)
         if not diagram:
             return {}
         
+        ids = frozenset(element_ids)
         highlighted_elements = []
         for element in diagram.elements:
-            if element.id in element_ids:
+            if element.id in ids:
                 highlighted_elements.append({
                     "id": element.id,
                     "name": element.name,
@@ -204,28 +254,21 @@ class C4DiagramGenerator:
         if not diagram:
             return go.Figure()
         
+        highlighted = frozenset(highlighted_elements or ())
+        
         # Create nodes
-        node_x = []
-        node_y = []
         node_text = []
         node_colors = []
         node_sizes = []
         
         # Position elements in a circle
-        import math
-        num_elements = len(diagram.elements)
-        for i, element in enumerate(diagram.elements):
-            angle = 2 * math.pi * i / num_elements
-            radius = 3
-            x = radius * math.cos(angle)
-            y = radius * math.sin(angle)
-            
-            node_x.append(x)
-            node_y.append(y)
+        node_x, node_y = _circle_layout(len(diagram.elements), 3)
+        
+        for element in diagram.elements:
             node_text.append(f"{element.name}<br>{element.type}")
             
             # Color based on highlighting
-            if highlighted_elements and element.id in highlighted_elements:
+            if element.id in highlighted:
                 node_colors.append("red")
                 node_sizes.append(30)
             else:
@@ -236,18 +279,17 @@ class C4DiagramGenerator:
         edge_x = []
         edge_y = []
         edge_text = []
+        id_to_idx = {element.id: i for i, element in enumerate(diagram.elements)}
         
         for rel in diagram.relationships:
-            from_element = next((e for e in diagram.elements if e.id == rel["from"]), None)
-            to_element = next((e for e in diagram.elements if e.id == rel["to"]), None)
+            from_idx = id_to_idx.get(rel["from"])
+            to_idx = id_to_idx.get(rel["to"])
+            if from_idx is None or to_idx is None:
+                continue
             
-            if from_element and to_element:
-                from_idx = diagram.elements.index(from_element)
-                to_idx = diagram.elements.index(to_element)
-                
-                edge_x.extend([node_x[from_idx], node_x[to_idx], None])
-                edge_y.extend([node_y[from_idx], node_y[to_idx], None])
-                edge_text.append(rel["description"])
+            edge_x.extend([node_x[from_idx], node_x[to_idx], None])
+            edge_y.extend([node_y[from_idx], node_y[to_idx], None])
+            edge_text.append(rel["description"])
         
         # Create figure
         fig = go.Figure()
@@ -265,7 +307,7 @@ class C4DiagramGenerator:
         
         # Add nodes
         fig.add_trace(go.Scatter(
-            x=node_x, y=node_y,
+            x=node_x.tolist(), y=node_y.tolist(),
             mode='markers+text',
             marker=dict(
                 size=node_sizes,
@@ -322,9 +364,9 @@ class C4DiagramGenerator:
             return None
         
         # Find existing diagram for this element
-        for diagram in self.diagrams.values():
-            if diagram.elements and diagram.elements[0].id == element_id:
-                return diagram
+        existing = self._diagrams_by_root.get(element_id)
+        if existing:
+            return self.diagrams[existing]
         
         # Create new diagram for children
         child_elements = [self.elements[child_id] for child_id in element.children 
@@ -344,6 +386,8 @@ class C4DiagramGenerator:
         )
         
         self.diagrams[diagram.id] = diagram
+        self._diagrams_by_root[element_id] = diagram.id
+        self._bump_version(diagram.id)
         return diagram
     
     def _get_next_level(self, current_level: C4Level) -> C4Level:
@@ -364,25 +408,25 @@ class C4DiagramGenerator:
             return ""
         
         if format == "json":
-            return diagram.model_dump_json()
+            return orjson.dumps(diagram.model_dump(mode="json")).decode()
         elif format == "dot":
             return self._generate_dot_format(diagram)
         else:
-            return diagram.model_dump_json()
+            return orjson.dumps(diagram.model_dump(mode="json")).decode()
     
     def _generate_dot_format(self, diagram: C4Diagram) -> str:
         """Generate DOT format for Graphviz"""
-        dot_lines = ["digraph G {"]
-        dot_lines.append("  rankdir=TB;")
-        dot_lines.append("  node [shape=box, style=filled, fillcolor=lightblue];")
-        
-        # Add nodes
-        for element in diagram.elements:
-            dot_lines.append(f'  "{element.id}" [label="{element.name}\\n{element.type}"];')
-        
-        # Add edges
-        for rel in diagram.relationships:
-            dot_lines.append(f'  "{rel["from"]}" -> "{rel["to"]}" [label="{rel["description"]}"];')
-        
-        dot_lines.append("}")
-        return "\n".join(dot_lines)
\ No newline at end of file
+        header = [
+            "digraph G {",
+            "  rankdir=TB;",
+            "  node [shape=box, style=filled, fillcolor=lightblue];"
+        ]
+        nodes = (
+            f'  "{_dot_escape(element.id)}" [label="{_dot_escape(element.name)}\\n{_dot_escape(element.type)}"];'
+            for element in diagram.elements
+        )
+        edges = (
+            f'  "{_dot_escape(rel["from"])}" -> "{_dot_escape(rel["to"])}" [label="{_dot_escape(rel["description"])}"];'
+            for rel in diagram.relationships
+        )
+        return "\n".join(itertools.chain(header, nodes, edges, ["}"]))
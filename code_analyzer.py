@@ -1,22 +1,69 @@
 import os
-import re
-import ast
+import logging
+try:
+    # RE2 matches in linear time, so minified bundles cannot trigger backtracking blowups
+    import re2 as re
+except ImportError:
+    import re
+import asyncio
 import json
-from typing import Dict, Any, List, Optional
-from pathlib import Path
-import gitlab_client
+import math
+import copy
+import hashlib
+import threading
+import itertools
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Iterator
+from file_analyzers import analyze_file, detect_language, LANGUAGE_PARSERS
+from gitlab_client import gitlab_client
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Name fragments that mark classes as services, functions as endpoints, components as pages
+_SERVICE_RE = re.compile(r'service|api|controller|handler|endpoint|server|app|main|application')
+_ENDPOINT_DECORATOR_RE = re.compile(r'route|endpoint')
+_PAGE_RE = re.compile(r'page|screen|view')
+
+
+_CPU_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _get_cpu_pool() -> ProcessPoolExecutor:
+    """Create the analysis process pool on first use, not at import in every worker"""
+    global _CPU_POOL
+    if _CPU_POOL is None:
+        if settings.analysis_worker_python:
+            # e.g. a PyPy interpreter, whose JIT suits the pure-Python analyzers
+            mp_context = multiprocessing.get_context("spawn")
+            mp_context.set_executable(settings.analysis_worker_python)
+        else:
+            # The server has threads by now; forking it could deadlock the children
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            mp_context = multiprocessing.get_context(start_method)
+        _CPU_POOL = ProcessPoolExecutor(
+            max_workers=settings.analysis_workers or None,
+            mp_context=mp_context
+        )
+    return _CPU_POOL
+
+
+def shutdown_cpu_pool():
+    """Stop the analysis worker processes"""
+    global _CPU_POOL
+    if _CPU_POOL is not None:
+        _CPU_POOL.shutdown(wait=True)
+        _CPU_POOL = None
 
 
 class CodeAnalyzer:
     def __init__(self):
-        self.language_parsers = {
-            'python': self._analyze_python,
-            'javascript': self._analyze_javascript,
-            'typescript': self._analyze_typescript,
-            'react': self._analyze_react,
-            'java': self._analyze_java,
-            'go': self._analyze_go
-        }
+        # (language, react path, blake2b of content) -> analysis, least recently used first
+        self._file_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._file_cache_lock = threading.Lock()
         
     async def analyze_repository(self, repo_id: str, repo_path: str = None) -> Dict[str, Any]:
         """Analyze repository structure and code"""
@@ -34,271 +81,127 @@ class CodeAnalyzer:
                 "configuration": {}
             }
             
-            # Analyze each file
-            for file_info in files:
-                if file_info.get("type") == "file":
-                    file_path = file_info.get("path", "")
-                    content = await gitlab_client.get_file_content(repo_id, file_path)
-                    
-                    if content:
-                        file_analysis = self.analyze_file(file_path, content)
-                        if file_analysis:
-                            self._merge_analysis(analysis_result, file_analysis)
+            # Producers fetch contents while consumers analyze them; the bounded
+            # queue plus one batch per producer caps the file contents held in memory
+            paths = iter([
+                file_info.get("path", "")
+                for file_info in files
+                if file_info.get("type") == "file"
+            ])
+            queue: asyncio.Queue = asyncio.Queue(maxsize=settings.analysis_queue_size)
+            producers = [
+                asyncio.ensure_future(self._produce_files(repo_id, paths, queue))
+                # Each producer has a whole batch in flight
+                for _ in range(math.ceil(settings.analysis_concurrency / settings.mcp_batch_size))
+            ]
+            consumers = [
+                asyncio.ensure_future(self._consume_files(queue))
+                for _ in range(settings.analysis_workers or os.cpu_count() or 1)
+            ]
+            closer = asyncio.ensure_future(self._close_queue(producers, queue, len(consumers)))
+            try:
+                # Awaiting consumers together with the closer surfaces a failing
+                # consumer instead of leaving producers blocked on a full queue
+                _, *partial_results = await asyncio.gather(closer, *consumers)
+            finally:
+                for task in producers + consumers + [closer]:
+                    task.cancel()
+            
+            for partial in partial_results:
+                self._merge_analysis(analysis_result, partial)
             
             return analysis_result
             
         except Exception as e:
-            print(f"Error analyzing repository {repo_id}: {e}")
+            logger.error("Error analyzing repository %s: %s", repo_id, e)
             return {}
     
-    def analyze_file(self, file_path: str, content: str) -> Optional[Dict[str, Any]]:
-        """Analyze single file"""
-        file_ext = Path(file_path).suffix.lower()
-        language = self._detect_language(file_path, file_ext)
-        
-        if language in self.language_parsers:
-            return self.language_parsers[language](file_path, content)
-        
-        return None
+    async def _produce_files(self, repo_id: str, paths: Iterator[str], queue: asyncio.Queue):
+        """Fetch file contents onto the queue until the shared paths run out"""
+        while True:
+            batch = list(itertools.islice(paths, settings.mcp_batch_size))
+            if not batch:
+                return
+            
+            contents = await gitlab_client.get_file_contents_batch(repo_id, batch)
+            for file_path in batch:
+                content = contents.get(file_path)
+                if content:
+                    await queue.put((file_path, content))
     
-    def _detect_language(self, file_path: str, file_ext: str) -> str:
-        """Detect programming language from file"""
-        if file_ext == '.py':
-            return 'python'
-        elif file_ext in ['.js', '.jsx']:
-            return 'javascript'
-        elif file_ext in ['.ts', '.tsx']:
-            return 'typescript'
-        elif file_ext == '.java':
-            return 'java'
-        elif file_ext == '.go':
-            return 'go'
-        elif 'package.json' in file_path:
-            return 'javascript'
-        elif 'requirements.txt' in file_path:
-            return 'python'
-        else:
-            return 'unknown'
+    async def _close_queue(self, producers: List[asyncio.Future], queue: asyncio.Queue, consumers: int):
+        """Wait for the producers, then send one None sentinel per consumer"""
+        await asyncio.gather(*producers)
+        for _ in range(consumers):
+            await queue.put(None)
     
-    def _analyze_python(self, file_path: str, content: str) -> Dict[str, Any]:
-        """Analyze Python file"""
-        try:
-            tree = ast.parse(content)
-            analysis = {
-                "classes": [],
-                "functions": [],
-                "imports": [],
-                "api_endpoints": [],
-                "database_models": []
-            }
-            
-            for node in ast.walk(tree):
-                if isinstance(node, ast.ClassDef):
-                    class_info = {
-                        "name": node.name,
-                        "line": node.lineno,
-                        "methods": [],
-                        "bases": [base.id for base in node.bases if isinstance(base, ast.Name)],
-                        "decorators": [self._get_decorator_name(d) for d in node.decorator_list]
-                    }
-                    
-                    # Check for database models
-                    if any(base in ['Model', 'Base'] for base in class_info["bases"]):
-                        analysis["database_models"].append(class_info)
-                    
-                    # Check for API classes
-                    if any('api' in dec.lower() or 'route' in dec.lower() for dec in class_info["decorators"]):
-                        analysis["api_endpoints"].append(class_info)
-                    
-                    analysis["classes"].append(class_info)
-                    
-                elif isinstance(node, ast.FunctionDef):
-                    func_info = {
-                        "name": node.name,
-                        "line": node.lineno,
-                        "decorators": [self._get_decorator_name(d) for d in node.decorator_list]
-                    }
-                    
-                    # Check for API endpoints
-                    if any('route' in dec.lower() or 'endpoint' in dec.lower() for dec in func_info["decorators"]):
-                        analysis["api_endpoints"].append(func_info)
-                    
-                    analysis["functions"].append(func_info)
-                    
-                elif isinstance(node, ast.Import):
-                    for alias in node.names:
-                        analysis["imports"].append(alias.name)
-                        
-                elif isinstance(node, ast.ImportFrom):
-                    module = node.module or ""
-                    for alias in node.names:
-                        analysis["imports"].append(f"{module}.{alias.name}")
+    async def _consume_files(self, queue: asyncio.Queue) -> Dict[str, Any]:
+        """Analyze queued files until a None sentinel, merging into a local result"""
+        partial: Dict[str, Any] = {}
+        while True:
+            item = await queue.get()
+            if item is None:
+                return partial
             
-            return analysis
-            
-        except SyntaxError:
-            return {}
+            file_analysis = await self._analyze_content(*item)
+            if file_analysis:
+                self._merge_analysis(partial, file_analysis)
     
-    def _analyze_javascript(self, file_path: str, content: str) -> Dict[str, Any]:
-        """Analyze JavaScript file"""
-        analysis = {
-            "classes": [],
-            "functions": [],
-            "imports": [],
-            "api_endpoints": [],
-            "components": []
-        }
-        
-        # Extract imports
-        import_pattern = r'import\s+(?:\{[^}]*\}|\w+)\s+from\s+[\'"]([^\'"]+)[\'"]'
-        imports = re.findall(import_pattern, content)
-        analysis["imports"].extend(imports)
-        
-        # Extract classes
-        class_pattern = r'class\s+(\w+)(?:\s+extends\s+(\w+))?'
-        classes = re.finditer(class_pattern, content)
-        for match in classes:
-            class_info = {
-                "name": match.group(1),
-                "extends": match.group(2),
-                "line": content[:match.start()].count('\n') + 1
-            }
-            analysis["classes"].append(class_info)
-        
-        # Extract functions
-        func_pattern = r'(?:export\s+)?(?:async\s+)?function\s+(\w+)|(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?\([^)]*\)\s*=>'
-        functions = re.finditer(func_pattern, content)
-        for match in functions:
-            func_name = match.group(1) or match.group(2)
-            if func_name:
-                func_info = {
-                    "name": func_name,
-                    "line": content[:match.start()].count('\n') + 1
-                }
-                analysis["functions"].append(func_info)
+    async def _analyze_content(self, file_path: str, content: str) -> Optional[Dict[str, Any]]:
+        """Analyze fetched content off the event loop, using the digest cache"""
+        key = self._cache_key(file_path, content)
+        if key is None:
+            return None
         
-        # Check for React components
-        if 'React' in content or 'react' in file_path.lower():
-            component_pattern = r'(?:export\s+)?(?:default\s+)?(?:function|const)\s+(\w+)(?:\s*\([^)]*\)\s*{|.*=.*\([^)]*\)\s*=>)'
-            components = re.finditer(component_pattern, content)
-            for match in components:
-                component_info = {
-                    "name": match.group(1),
-                    "line": content[:match.start()].count('\n') + 1
-                }
-                analysis["components"].append(component_info)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
         
+        # Parsing is CPU-bound, so misses go to worker processes past the GIL
+        loop = asyncio.get_running_loop()
+        analysis = await loop.run_in_executor(_get_cpu_pool(), analyze_file, file_path, content)
+        self._cache_put(key, analysis)
         return analysis
     
-    def _analyze_typescript(self, file_path: str, content: str) -> Dict[str, Any]:
-        """Analyze TypeScript file"""
-        # Similar to JavaScript but with type annotations
-        return self._analyze_javascript(file_path, content)
-    
-    def _analyze_react(self, file_path: str, content: str) -> Dict[str, Any]:
-        """Analyze React file specifically"""
-        analysis = self._analyze_javascript(file_path, content)
-        
-        # Additional React-specific analysis
-        # Extract JSX components
-        jsx_pattern = r'<(\w+)(?:\s+[^>]*)?>'
-        jsx_components = set(re.findall(jsx_pattern, content))
-        analysis["jsx_components"] = list(jsx_components)
+    def analyze_file(self, file_path: str, content: str) -> Optional[Dict[str, Any]]:
+        """Analyze single file"""
+        key = self._cache_key(file_path, content)
+        if key is None:
+            return None
         
-        # Extract hooks usage
-        hook_pattern = r'use[A-Z]\w+'
-        hooks = re.findall(hook_pattern, content)
-        analysis["hooks"] = list(set(hooks))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
         
+        analysis = analyze_file(file_path, content)
+        self._cache_put(key, analysis)
         return analysis
     
-    def _analyze_java(self, file_path: str, content: str) -> Dict[str, Any]:
-        """Analyze Java file"""
-        analysis = {
-            "classes": [],
-            "methods": [],
-            "imports": [],
-            "api_endpoints": []
-        }
-        
-        # Extract imports
-        import_pattern = r'import\s+([^;]+);'
-        imports = re.findall(import_pattern, content)
-        analysis["imports"].extend(imports)
-        
-        # Extract classes
-        class_pattern = r'(?:public\s+)?(?:abstract\s+)?class\s+(\w+)(?:\s+extends\s+(\w+))?(?:\s+implements\s+([^{]+))?'
-        classes = re.finditer(class_pattern, content)
-        for match in classes:
-            class_info = {
-                "name": match.group(1),
-                "extends": match.group(2),
-                "implements": match.group(3).split(',') if match.group(3) else [],
-                "line": content[:match.start()].count('\n') + 1
-            }
-            analysis["classes"].append(class_info)
+    def _cache_key(self, file_path: str, content: str) -> Optional[tuple]:
+        """Cache key for a supported file, None if the language is not analyzed"""
+        language = detect_language(file_path)
+        if language not in LANGUAGE_PARSERS:
+            return None
         
-        # Extract methods
-        method_pattern = r'(?:public|private|protected)?\s+(?:static\s+)?(?:final\s+)?(?:<[^>]+>\s+)?(\w+)\s+(\w+)\s*\([^)]*\)'
-        methods = re.finditer(method_pattern, content)
-        for match in methods:
-            method_info = {
-                "return_type": match.group(1),
-                "name": match.group(2),
-                "line": content[:match.start()].count('\n') + 1
-            }
-            analysis["methods"].append(method_info)
-        
-        return analysis
+        # JS component detection also looks at the path, so it is part of the key
+        digest = hashlib.blake2b(content.encode('utf-8', 'ignore'), digest_size=16).digest()
+        return (language, 'react' in file_path.lower(), digest)
     
-    def _analyze_go(self, file_path: str, content: str) -> Dict[str, Any]:
-        """Analyze Go file"""
-        analysis = {
-            "structs": [],
-            "functions": [],
-            "imports": [],
-            "api_endpoints": []
-        }
-        
-        # Extract imports
-        import_pattern = r'import\s+\(([^)]+)\)'
-        import_blocks = re.findall(import_pattern, content)
-        for block in import_blocks:
-            imports = re.findall(r'[\'"]([^\'"]+)[\'"]', block)
-            analysis["imports"].extend(imports)
-        
-        # Extract structs
-        struct_pattern = r'type\s+(\w+)\s+struct'
-        structs = re.finditer(struct_pattern, content)
-        for match in structs:
-            struct_info = {
-                "name": match.group(1),
-                "line": content[:match.start()].count('\n') + 1
-            }
-            analysis["structs"].append(struct_info)
-        
-        # Extract functions
-        func_pattern = r'func\s+(?:\(\w+\s+\w+\)\s+)?(\w+)\s*\([^)]*\)'
-        functions = re.finditer(func_pattern, content)
-        for match in functions:
-            func_info = {
-                "name": match.group(1),
-                "line": content[:match.start()].count('\n') + 1
-            }
-            analysis["functions"].append(func_info)
-        
-        return analysis
+    def _cache_get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached analysis, marking it recently used"""
+        with self._file_cache_lock:
+            cached = self._file_cache.get(key)
+            if cached is None:
+                return None
+            self._file_cache.move_to_end(key)
+        return copy.deepcopy(cached)
     
-    def _get_decorator_name(self, decorator) -> str:
-        """Extract decorator name from AST node"""
-        if isinstance(decorator, ast.Name):
-            return decorator.id
-        elif isinstance(decorator, ast.Call):
-            if isinstance(decorator.func, ast.Name):
-                return decorator.func.id
-            elif isinstance(decorator.func, ast.Attribute):
-                return decorator.func.attr
-        return ""
+    def _cache_put(self, key: tuple, analysis: Dict[str, Any]):
+        """Store a copy of the analysis, evicting the least recently used entry"""
+        with self._file_cache_lock:
+            self._file_cache[key] = copy.deepcopy(analysis)
+            if len(self._file_cache) > settings.analysis_cache_size:
+                self._file_cache.popitem(last=False)
     
     def _merge_analysis(self, target: Dict[str, Any], source: Dict[str, Any]):
         """Merge analysis results"""
@@ -312,20 +215,15 @@ class CodeAnalyzer:
         """Extract service information from analysis"""
         services = []
         
-        # Look for service indicators
-        service_indicators = [
-            'service', 'api', 'controller', 'handler', 'endpoint',
-            'server', 'app', 'main', 'application'
-        ]
-        
         for class_info in analysis_result.get("classes", []):
-            class_name = class_info.get("name", "").lower()
-            if any(indicator in class_name for indicator in service_indicators):
+            get = class_info.get
+            name = get("name", "")
+            if _SERVICE_RE.search(name.lower()):
                 services.append({
-                    "name": class_info.get("name"),
+                    "name": name,
                     "type": "service",
-                    "methods": class_info.get("methods", []),
-                    "line": class_info.get("line")
+                    "methods": get("methods", []),
+                    "line": get("line")
                 })
         
         return services
@@ -336,23 +234,25 @@ class CodeAnalyzer:
         
         # Python Flask/FastAPI endpoints
         for func_info in analysis_result.get("functions", []):
-            decorators = func_info.get("decorators", [])
-            if any('route' in dec.lower() or 'endpoint' in dec.lower() for dec in decorators):
+            get = func_info.get
+            decorators = get("decorators", [])
+            if any(_ENDPOINT_DECORATOR_RE.search(dec.lower()) for dec in decorators):
                 endpoints.append({
-                    "name": func_info.get("name"),
+                    "name": get("name"),
                     "type": "endpoint",
                     "decorators": decorators,
-                    "line": func_info.get("line")
+                    "line": get("line")
                 })
         
         # React components that might be pages
         for component_info in analysis_result.get("components", []):
-            component_name = component_info.get("name", "").lower()
-            if any(page in component_name for page in ['page', 'screen', 'view']):
+            get = component_info.get
+            name = get("name", "")
+            if _PAGE_RE.search(name.lower()):
                 endpoints.append({
-                    "name": component_info.get("name"),
+                    "name": name,
                     "type": "page",
-                    "line": component_info.get("line")
+                    "line": get("line")
                 })
         
         return endpoints
@@ -361,35 +261,19 @@ class CodeAnalyzer:
         """Find code references matching search term"""
         references = []
         search_term_lower = search_term.lower()
+        file_path = analysis_result.get("file_path", "")
         
-        # Search in classes
-        for class_info in analysis_result.get("classes", []):
-            if search_term_lower in class_info.get("name", "").lower():
-                references.append({
-                    "type": "class",
-                    "name": class_info.get("name"),
-                    "line": class_info.get("line"),
-                    "file": analysis_result.get("file_path", "")
-                })
-        
-        # Search in functions
-        for func_info in analysis_result.get("functions", []):
-            if search_term_lower in func_info.get("name", "").lower():
-                references.append({
-                    "type": "function",
-                    "name": func_info.get("name"),
-                    "line": func_info.get("line"),
-                    "file": analysis_result.get("file_path", "")
-                })
-        
-        # Search in components
-        for component_info in analysis_result.get("components", []):
-            if search_term_lower in component_info.get("name", "").lower():
-                references.append({
-                    "type": "component",
-                    "name": component_info.get("name"),
-                    "line": component_info.get("line"),
-                    "file": analysis_result.get("file_path", "")
-                })
+        # Search in classes, functions and components
+        for ref_type, key in (("class", "classes"), ("function", "functions"), ("component", "components")):
+            for info in analysis_result.get(key, []):
+                get = info.get
+                name = get("name", "")
+                if search_term_lower in name.lower():
+                    references.append({
+                        "type": ref_type,
+                        "name": name,
+                        "line": get("line"),
+                        "file": file_path
+                    })
         
-        return references
\ No newline at end of file
+        return references
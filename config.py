@@ -1,12 +1,24 @@
 import os
-from typing import Optional
-from pydantic import BaseSettings
+from typing import List, Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
+    # Unknown .env keys were ignored by pydantic v1 settings; keep that behaviour
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+    
     # LLM Configuration
     local_llm_url: str = "http://localhost:11434"
     local_llm_model: str = "llama2"
+    local_llm_embedding_model: Optional[str] = None
+    llm_batch_window_ms: int = 5
+    
+    # Semantic Cache Configuration
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_size: int = 256
+    semantic_cache_max_history: int = 6
+    lsh_num_tables: int = 4
+    lsh_num_bits: int = 8
     
     # GitLab Configuration
     gitlab_url: Optional[str] = None
@@ -14,6 +26,8 @@ class Settings(BaseSettings):
     
     # MCP Configuration
     mcp_server_url: str = "ws://localhost:3000"
+    mcp_batch_size: int = 32
+    mcp_request_timeout: float = 30.0  # seconds to wait for a response
     
     # Database Configuration
     database_url: str = "sqlite:///./agents.db"
@@ -21,13 +35,23 @@ class Settings(BaseSettings):
     # Web Interface Configuration
     host: str = "0.0.0.0"
     port: int = 8000
+    ws_flush_interval_ms: int = 2
+    ws_accept_text_frames: bool = False  # accept text frames from older clients
+    cors_origins: List[str] = ["*"]  # origins allowed to call /api/
     
     # Agent Configuration
     max_context_length: int = 4096
+    memory_token_budget: int = 2000
+    memory_keep_messages: int = 6
     max_agents: int = 10
-    
-    class Config:
-        env_file = ".env"
+    agent_idle_ttl: int = 1800
+    agent_sweep_interval: int = 60
+    max_tool_concurrency: int = 4
+    analysis_concurrency: int = 32
+    analysis_cache_size: int = 2048
+    analysis_workers: int = 0  # 0 = one worker process per CPU
+    analysis_queue_size: int = 64
+    analysis_worker_python: Optional[str] = None  # interpreter for analysis workers, e.g. pypy3
 
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,321 @@
+# Pure-Python file analyzers run in the analysis worker processes. Only the
+# standard library and numpy are imported here, so the workers can also run
+# under an interpreter without the web stack installed, such as PyPy.
+import ast
+import bisect
+import sys
+try:
+    # RE2 matches in linear time, so minified bundles cannot trigger backtracking blowups
+    import re2 as re
+except ImportError:
+    import re
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+
+# Patterns compiled once at import instead of on every analyzed file
+# JS/TS constructs fused into one alternation so each file is scanned once;
+# the React variant additionally collects JSX tags and hook calls
+_JS_PATTERNS = [
+    # default, named, default + named and namespace imports
+    r'(?P<import>import\s+(?:\w+\s*,\s*)?(?:\{[^}]*\}|\*\s*as\s+\w+|\w+)\s+from\s+[\'"](?P<import_path>[^\'"]+)[\'"])',
+    r'(?P<klass>class\s+(?P<class_name>\w+)(?:\s+extends\s+(?P<class_base>\w+))?)',
+    r'(?P<func>(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s+(?P<func_name>\w+)'
+    r'|(?:export\s+)?(?:const|let|var)\s+(?P<arrow_name>\w+)\s*=\s*(?:async\s+)?\([^)]*\)\s*=>)',
+]
+_JS_COMBINED_RE = re.compile('|'.join(_JS_PATTERNS))
+_REACT_COMBINED_RE = re.compile('|'.join(_JS_PATTERNS + [
+    r'(?P<jsx><(?P<jsx_name>\w+)(?:\s+[^>]*)?>)',
+    r'(?P<hook>use[A-Z]\w+)',
+]))
+_JAVA_IMPORT_RE = re.compile(r'import\s+([^;]+);')
+_JAVA_CLASS_RE = re.compile(r'(?:public\s+)?(?:abstract\s+)?class\s+(\w+)(?:\s+extends\s+(\w+))?(?:\s+implements\s+([^{]+))?')
+_JAVA_METHOD_RE = re.compile(r'(?:public|private|protected)?\s+(?:static\s+)?(?:final\s+)?(?:<[^>]+>\s+)?(\w+)\s+(\w+)\s*\([^)]*\)')
+_GO_IMPORT_BLOCK_RE = re.compile(r'import\s+\(([^)]+)\)')
+_GO_IMPORT_STR_RE = re.compile(r'[\'"]([^\'"]+)[\'"]')
+_GO_STRUCT_RE = re.compile(r'type\s+(\w+)\s+struct')
+_GO_FUNC_RE = re.compile(r'func\s+(?:\(\w+\s+\w+\)\s+)?(\w+)\s*\([^)]*\)')
+
+_EXT_LANG = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.jsx': 'javascript',
+    '.ts': 'typescript',
+    '.tsx': 'typescript',
+    '.java': 'java',
+    '.go': 'go'
+}
+_BASENAME_LANG = {
+    'package.json': 'javascript',
+    'requirements.txt': 'python'
+}
+
+
+def _get_decorator_name(decorator) -> str:
+    """Extract decorator name from AST node"""
+    if isinstance(decorator, ast.Name):
+        return decorator.id
+    elif isinstance(decorator, ast.Call):
+        if isinstance(decorator.func, ast.Name):
+            return decorator.func.id
+        elif isinstance(decorator.func, ast.Attribute):
+            return decorator.func.attr
+    return ""
+
+
+class _PyAnalyzer(ast.NodeVisitor):
+    """Collects classes, functions and imports from a Python module AST"""
+    
+    def __init__(self):
+        self.analysis = {
+            "classes": [],
+            "functions": [],
+            "imports": [],
+            "api_endpoints": [],
+            "database_models": []
+        }
+        # Interned since most files share module names; deduplicated in source order at the end
+        self.imports = []
+    
+    def visit_ClassDef(self, node: ast.ClassDef):
+        """Record class and visit its methods"""
+        class_info = {
+            "name": node.name,
+            "line": node.lineno,
+            "methods": [],
+            "bases": [base.id for base in node.bases if isinstance(base, ast.Name)],
+            "decorators": [_get_decorator_name(d) for d in node.decorator_list]
+        }
+        
+        # Check for database models
+        if any(base in ['Model', 'Base'] for base in class_info["bases"]):
+            self.analysis["database_models"].append(class_info)
+        
+        # Check for API classes
+        if any('api' in dec.lower() or 'route' in dec.lower() for dec in class_info["decorators"]):
+            self.analysis["api_endpoints"].append(class_info)
+        
+        self.analysis["classes"].append(class_info)
+        self.generic_visit(node)
+    
+    def visit_FunctionDef(self, node):
+        """Record function without descending into its body"""
+        func_info = {
+            "name": node.name,
+            "line": node.lineno,
+            "decorators": [_get_decorator_name(d) for d in node.decorator_list]
+        }
+        
+        # Check for API endpoints
+        if any('route' in dec.lower() or 'endpoint' in dec.lower() for dec in func_info["decorators"]):
+            self.analysis["api_endpoints"].append(func_info)
+        
+        self.analysis["functions"].append(func_info)
+    
+    visit_AsyncFunctionDef = visit_FunctionDef
+    
+    def visit_Import(self, node: ast.Import):
+        """Record plain imports"""
+        for alias in node.names:
+            self.imports.append(sys.intern(alias.name))
+    
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        """Record from-imports as module.name"""
+        module = node.module or ""
+        for alias in node.names:
+            self.imports.append(sys.intern(f"{module}.{alias.name}"))
+
+
+def _build_line_index(content: str) -> List[int]:
+    """Sorted start offsets of every line, for bisecting match positions"""
+    if content.isascii():
+        chars = np.frombuffer(content.encode('ascii'), dtype=np.uint8)
+    else:
+        # UTF-32 has one code unit per character, so offsets stay character offsets
+        chars = np.frombuffer(content.encode('utf-32-le'), dtype=np.uint32)
+    return [0] + (np.flatnonzero(chars == 10) + 1).tolist()
+
+
+def detect_language(file_path: str) -> str:
+    """Detect programming language from file"""
+    # Slicing after rfind avoids building a Path per file; a dot before the
+    # last slash belongs to a directory name, not an extension
+    slash = file_path.rfind('/')
+    dot = file_path.rfind('.')
+    if dot > slash:
+        language = _EXT_LANG.get(file_path[dot:].lower())
+        if language:
+            return language
+    
+    return _BASENAME_LANG.get(file_path[slash + 1:], 'unknown')
+
+
+def _analyze_python(file_path: str, content: str) -> Dict[str, Any]:
+    """Analyze Python file"""
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        return {}
+    
+    visitor = _PyAnalyzer()
+    visitor.visit(tree)
+    visitor.analysis["imports"] = list(dict.fromkeys(visitor.imports))
+    return visitor.analysis
+
+
+def _analyze_javascript(file_path: str, content: str, react: bool = False) -> Dict[str, Any]:
+    """Analyze JavaScript file"""
+    analysis = {
+        "classes": [],
+        "functions": [],
+        "imports": [],
+        "api_endpoints": [],
+        "components": []
+    }
+    if react:
+        analysis["jsx_components"] = set()
+        analysis["hooks"] = set()
+    
+    line_index = _build_line_index(content)
+    pattern = _REACT_COMBINED_RE if react else _JS_COMBINED_RE
+    
+    for match in pattern.finditer(content):
+        kind = match.lastgroup
+        if kind == "import":
+            import_path = match.group("import_path")
+            analysis["imports"].append(import_path)
+            # A react import marks the file as React without rescanning it
+            if import_path == "react" or import_path.startswith(("react/", "react-")):
+                react = True
+        elif kind == "klass":
+            analysis["classes"].append({
+                "name": match.group("class_name"),
+                "extends": match.group("class_base"),
+                "line": bisect.bisect_right(line_index, match.start())
+            })
+        elif kind == "func":
+            analysis["functions"].append({
+                "name": match.group("func_name") or match.group("arrow_name"),
+                "line": bisect.bisect_right(line_index, match.start())
+            })
+        elif kind == "jsx":
+            analysis["jsx_components"].add(match.group("jsx_name"))
+        elif kind == "hook":
+            analysis["hooks"].add(match.group())
+    
+    # In React files, top-level functions double as component candidates
+    if react or 'React' in content or 'react' in file_path.lower():
+        analysis["components"] = [dict(func_info) for func_info in analysis["functions"]]
+    if "hooks" in analysis:
+        analysis["jsx_components"] = list(analysis["jsx_components"])
+        analysis["hooks"] = list(analysis["hooks"])
+    
+    return analysis
+
+
+def _analyze_typescript(file_path: str, content: str) -> Dict[str, Any]:
+    """Analyze TypeScript file"""
+    # Similar to JavaScript but with type annotations
+    return _analyze_javascript(file_path, content)
+
+
+def _analyze_react(file_path: str, content: str) -> Dict[str, Any]:
+    """Analyze React file specifically"""
+    return _analyze_javascript(file_path, content, react=True)
+
+
+def _analyze_java(file_path: str, content: str) -> Dict[str, Any]:
+    """Analyze Java file"""
+    analysis = {
+        "classes": [],
+        "methods": [],
+        "imports": [],
+        "api_endpoints": []
+    }
+    
+    line_index = _build_line_index(content)
+    
+    # Extract imports
+    imports = _JAVA_IMPORT_RE.findall(content)
+    analysis["imports"].extend(imports)
+    
+    # Extract classes
+    classes = _JAVA_CLASS_RE.finditer(content)
+    for match in classes:
+        class_info = {
+            "name": match.group(1),
+            "extends": match.group(2),
+            "implements": match.group(3).split(',') if match.group(3) else [],
+            "line": bisect.bisect_right(line_index, match.start())
+        }
+        analysis["classes"].append(class_info)
+    
+    # Extract methods
+    methods = _JAVA_METHOD_RE.finditer(content)
+    for match in methods:
+        method_info = {
+            "return_type": match.group(1),
+            "name": match.group(2),
+            "line": bisect.bisect_right(line_index, match.start())
+        }
+        analysis["methods"].append(method_info)
+    
+    return analysis
+
+
+def _analyze_go(file_path: str, content: str) -> Dict[str, Any]:
+    """Analyze Go file"""
+    analysis = {
+        "structs": [],
+        "functions": [],
+        "imports": [],
+        "api_endpoints": []
+    }
+    
+    line_index = _build_line_index(content)
+    
+    # Extract imports
+    import_blocks = _GO_IMPORT_BLOCK_RE.findall(content)
+    for block in import_blocks:
+        imports = _GO_IMPORT_STR_RE.findall(block)
+        analysis["imports"].extend(imports)
+    
+    # Extract structs
+    structs = _GO_STRUCT_RE.finditer(content)
+    for match in structs:
+        struct_info = {
+            "name": match.group(1),
+            "line": bisect.bisect_right(line_index, match.start())
+        }
+        analysis["structs"].append(struct_info)
+    
+    # Extract functions
+    functions = _GO_FUNC_RE.finditer(content)
+    for match in functions:
+        func_info = {
+            "name": match.group(1),
+            "line": bisect.bisect_right(line_index, match.start())
+        }
+        analysis["functions"].append(func_info)
+    
+    return analysis
+
+
+LANGUAGE_PARSERS = {
+    'python': _analyze_python,
+    'javascript': _analyze_javascript,
+    'typescript': _analyze_typescript,
+    'react': _analyze_react,
+    'java': _analyze_java,
+    'go': _analyze_go
+}
+
+
+def analyze_file(file_path: str, content: str) -> Optional[Dict[str, Any]]:
+    """Analyze single file; module-level so process pool workers can run it"""
+    language = detect_language(file_path)
+    
+    if language not in LANGUAGE_PARSERS:
+        return None
+    
+    return LANGUAGE_PARSERS[language](file_path, content)
@@ -1,20 +1,40 @@
 import asyncio
+import logging
 import json
 import websockets
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple
 from config import settings
 
+logger = logging.getLogger(__name__)
+
+
+class _BatchRejected(Exception):
+    """The server answered a JSON-RPC batch with a single id-less error"""
+
 
 class GitLabMCPClient:
     def __init__(self):
         self.server_url = settings.mcp_server_url
         self.websocket = None
         self.request_id = 0
+        self._connected = False
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._send_lock: Optional[asyncio.Lock] = None
+        # request id -> future resolved by the reader task with the response
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader: Optional[asyncio.Task] = None
+        # Ids of batch requests in flight, failed together if the batch is rejected
+        self._batch_ids: Set[int] = set()
+        # Batches are optional in the MCP protocol; cleared on the first rejection
+        self._batch_supported = True
         
     async def connect(self):
         """Connect to MCP server"""
+        # Never leak the socket and reader of an earlier connection
+        await self._close_connection(ConnectionError("Reconnecting to MCP server"))
         try:
             self.websocket = await websockets.connect(self.server_url)
+            self._reader = asyncio.ensure_future(self._reader_loop())
             # Initialize MCP connection
             await self._send_request("initialize", {
                 "protocolVersion": "2024-11-05",
@@ -29,20 +49,112 @@ class GitLabMCPClient:
             })
             return True
         except Exception as e:
-            print(f"Failed to connect to MCP server: {e}")
+            logger.error("Failed to connect to MCP server: %s", e)
+            await self._close_connection(ConnectionError(f"Failed to connect to MCP server: {e}"))
             return False
     
+    async def ensure_connected(self) -> bool:
+        """Connect once; a no-op while the connection is up"""
+        if self._connected:
+            return True
+        
+        # Created lazily so the lock belongs to the running event loop
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if not self._connected:
+                self._connected = await self.connect()
+        return self._connected
+    
     async def disconnect(self):
         """Disconnect from MCP server"""
+        await self._close_connection(ConnectionError("Disconnected from MCP server"))
+    
+    async def _close_connection(self, error: Exception):
+        """Stop the reader, close the socket and fail requests still in flight"""
+        self._connected = False
+        if self._reader:
+            self._reader.cancel()
+            self._reader = None
         if self.websocket:
-            await self.websocket.close()
-            self.websocket = None
+            websocket, self.websocket = self.websocket, None
+            try:
+                await websocket.close()
+            except Exception as e:
+                logger.debug("Error closing MCP socket: %s", e)
+        self._fail_pending(error)
     
-    async def _send_request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Send request to MCP server"""
-        if not self.websocket:
-            raise Exception("Not connected to MCP server")
+    async def _reader_loop(self):
+        """Route every incoming response to the future waiting on its id"""
+        try:
+            while True:
+                frame = await self.websocket.recv()
+                try:
+                    message = json.loads(frame)
+                except ValueError as e:
+                    logger.warning("Skipping malformed MCP frame: %s", e)
+                    continue
+                # A batch request is answered with an array of responses
+                for response in message if isinstance(message, list) else [message]:
+                    if not isinstance(response, dict):
+                        logger.warning("Skipping unexpected MCP message: %r", response)
+                        continue
+                    if response.get("id") is None and self._batch_ids:
+                        self._fail_batches(_BatchRejected(response.get("error")))
+                        continue
+                    future = self._pending.pop(response.get("id"), None)
+                    if future is not None and not future.done():
+                        future.set_result(response)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("MCP connection lost: %s", e)
+            # Detach first so closing does not cancel this task; the next request reconnects
+            self._reader = None
+            await self._close_connection(ConnectionError(f"MCP connection lost: {e}"))
+    
+    def _fail_batches(self, error: Exception):
+        """Fail all batch requests still waiting for a response"""
+        batch_ids, self._batch_ids = self._batch_ids, set()
+        for request_id in batch_ids:
+            future = self._pending.pop(request_id, None)
+            if future is not None and not future.done():
+                future.set_exception(error)
+    
+    def _fail_pending(self, error: Exception):
+        """Fail all requests still waiting for a response"""
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+    
+    async def _send(self, requests: List[Dict[str, Any]], payload: Any) -> List[asyncio.Future]:
+        """Register a future per request, then send the payload as one frame"""
+        # Reconnects after a dropped connection or a failed startup connect
+        if not self.websocket and not await self.ensure_connected():
+            raise ConnectionError("Not connected to MCP server")
         
+        loop = asyncio.get_running_loop()
+        futures = []
+        for request in requests:
+            future = loop.create_future()
+            self._pending[request["id"]] = future
+            futures.append(future)
+        
+        # Only sends are serialized; responses are matched up by the reader task
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        try:
+            async with self._send_lock:
+                await self.websocket.send(json.dumps(payload))
+        except Exception:
+            for request in requests:
+                self._pending.pop(request["id"], None)
+            raise
+        return futures
+    
+    def _build_request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a JSON-RPC request with the next id"""
         request = {
             "jsonrpc": "2.0",
             "id": self.request_id,
@@ -50,10 +162,34 @@ class GitLabMCPClient:
             "params": params
         }
         self.request_id += 1
-        
-        await self.websocket.send(json.dumps(request))
-        response = await self.websocket.recv()
-        return json.loads(response)
+        return request
+    
+    async def _wait_responses(self, requests: List[Dict[str, Any]],
+                              futures: List[asyncio.Future]) -> List[Dict[str, Any]]:
+        """Wait for the responses, giving up after settings.mcp_request_timeout"""
+        try:
+            return list(await asyncio.wait_for(asyncio.gather(*futures), settings.mcp_request_timeout))
+        finally:
+            for request in requests:
+                self._pending.pop(request["id"], None)
+    
+    async def _send_request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Send request to MCP server"""
+        request = self._build_request(method, params)
+        futures = await self._send([request], request)
+        response, = await self._wait_responses([request], futures)
+        return response
+    
+    async def _send_batch(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Send several requests as one JSON-RPC batch; responses follow call order"""
+        batch = [self._build_request(method, params) for method, params in calls]
+        batch_ids = [request["id"] for request in batch]
+        self._batch_ids.update(batch_ids)
+        try:
+            futures = await self._send(batch, batch)
+            return await self._wait_responses(batch, futures)
+        finally:
+            self._batch_ids.difference_update(batch_ids)
     
     async def list_repositories(self) -> List[Dict[str, Any]]:
         """List GitLab repositories"""
@@ -61,7 +197,7 @@ class GitLabMCPClient:
             response = await self._send_request("gitlab/listRepositories", {})
             return response.get("result", {}).get("repositories", [])
         except Exception as e:
-            print(f"Error listing repositories: {e}")
+            logger.error("Error listing repositories: %s", e)
             return []
     
     async def get_repository(self, repo_id: str) -> Optional[Dict[str, Any]]:
@@ -70,7 +206,7 @@ class GitLabMCPClient:
             response = await self._send_request("gitlab/getRepository", {"id": repo_id})
             return response.get("result", {})
         except Exception as e:
-            print(f"Error getting repository: {e}")
+            logger.error("Error getting repository: %s", e)
             return None
     
     async def list_files(self, repo_id: str, path: str = "") -> List[Dict[str, Any]]:
@@ -82,7 +218,7 @@ class GitLabMCPClient:
             })
             return response.get("result", {}).get("files", [])
         except Exception as e:
-            print(f"Error listing files: {e}")
+            logger.error("Error listing files: %s", e)
             return []
     
     async def get_file_content(self, repo_id: str, file_path: str) -> Optional[str]:
@@ -94,9 +230,35 @@ class GitLabMCPClient:
             })
             return response.get("result", {}).get("content")
         except Exception as e:
-            print(f"Error getting file content: {e}")
+            logger.error("Error getting file content: %s", e)
             return None
     
+    async def get_file_contents_batch(self, repo_id: str, paths: List[str]) -> Dict[str, str]:
+        """Get contents of several files in one round trip"""
+        if self._batch_supported:
+            try:
+                responses = await self._send_batch([
+                    ("gitlab/getFileContent", {"repositoryId": repo_id, "path": path})
+                    for path in paths
+                ])
+                contents = {}
+                for path, response in zip(paths, responses):
+                    content = response.get("result", {}).get("content")
+                    if content is not None:
+                        contents[path] = content
+                return contents
+            except _BatchRejected as e:
+                logger.info("MCP server does not support batches (%s); fetching files one by one", e)
+                self._batch_supported = False
+            except asyncio.TimeoutError:
+                logger.warning("MCP batch timed out; fetching files one by one")
+            except Exception as e:
+                logger.error("Error getting file contents: %s", e)
+                return {}
+        
+        contents = await asyncio.gather(*[self.get_file_content(repo_id, path) for path in paths])
+        return {path: content for path, content in zip(paths, contents) if content is not None}
+    
     async def search_code(self, repo_id: str, query: str) -> List[Dict[str, Any]]:
         """Search code in repository"""
         try:
@@ -106,7 +268,7 @@ class GitLabMCPClient:
             })
             return response.get("result", {}).get("results", [])
         except Exception as e:
-            print(f"Error searching code: {e}")
+            logger.error("Error searching code: %s", e)
             return []
     
     async def get_commits(self, repo_id: str, branch: str = "main") -> List[Dict[str, Any]]:
@@ -118,7 +280,7 @@ class GitLabMCPClient:
             })
             return response.get("result", {}).get("commits", [])
         except Exception as e:
-            print(f"Error getting commits: {e}")
+            logger.error("Error getting commits: %s", e)
             return []
     
     async def clone_repository(self, repo_url: str, local_path: str) -> bool:
@@ -130,7 +292,7 @@ class GitLabMCPClient:
             })
             return response.get("result", {}).get("success", False)
         except Exception as e:
-            print(f"Error cloning repository: {e}")
+            logger.error("Error cloning repository: %s", e)
             return False
 
 
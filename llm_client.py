@@ -1,16 +1,82 @@
+import asyncio
+import logging
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, Iterator
 from config import settings
 
+logger = logging.getLogger(__name__)
+
+
+class LLMBatcher:
+    """Coalesce generate requests that arrive within a short window
+    
+    Ollama's /api/generate takes a single prompt, so a flush sends one
+    request per distinct payload, all at once over the shared connection
+    pool, and identical payloads in the window share a single result.
+    """
+    
+    def __init__(self, send: Callable[[Dict[str, Any]], Awaitable[str]], window_ms: int):
+        self._send = send
+        self._window = window_ms / 1000
+        self._queue: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._tasks = set()
+    
+    async def submit(self, payload: Dict[str, Any]) -> str:
+        """Queue payload for the current window and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((payload, future))
+        if len(self._queue) == 1:
+            loop.call_later(self._window, self._flush)
+        return await future
+    
+    def _flush(self):
+        """Dispatch everything queued during the window"""
+        batch, self._queue = self._queue, []
+        
+        groups: Dict[str, Tuple[Dict[str, Any], List[asyncio.Future]]] = {}
+        for payload, future in batch:
+            key = json.dumps(payload, sort_keys=True)
+            groups.setdefault(key, (payload, []))[1].append(future)
+        
+        for payload, futures in groups.values():
+            task = asyncio.ensure_future(self._dispatch(payload, futures))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _dispatch(self, payload: Dict[str, Any], futures: List[asyncio.Future]):
+        """Send one payload and resolve every future waiting on it"""
+        try:
+            result = await self._send(payload)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for future in futures:
+                if not future.done():
+                    future.set_result(result)
+
 
 class LocalLLMClient:
-    def __init__(self, model: str = None):
+    def __init__(self, model: str = None, embedding_model: str = None):
         self.base_url = settings.local_llm_url
         self.model = model or settings.local_llm_model
-        
-    def generate(self, prompt: str, system_prompt: str = None, **kwargs) -> str:
-        """Generate response from local LLM"""
+        self.embedding_model = embedding_model or settings.local_llm_embedding_model or self.model
+        # Pooled keep-alive connections for the synchronous calls
+        self._session = requests.Session()
+        self._session.mount(self.base_url, HTTPAdapter(pool_connections=8, pool_maxsize=16))
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._batcher = (
+            LLMBatcher(self._apost_generate, settings.llm_batch_window_ms)
+            if settings.llm_batch_window_ms > 0 else None
+        )
+    
+    def _generate_payload(self, prompt: str, system_prompt: str = None, **kwargs) -> Dict[str, Any]:
+        """Build Ollama generate request payload"""
         payload = {
             "model": self.model,
             "prompt": prompt,
@@ -20,19 +86,76 @@ class LocalLLMClient:
         
         if system_prompt:
             payload["system"] = system_prompt
-            
+        return payload
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Get pooled async HTTP client, creating it on first use"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, timeout=30)
+        return self._async_client
+    
+    async def aclose(self):
+        """Close pooled HTTP connections"""
+        self._session.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+    
+    async def __aenter__(self) -> "LocalLLMClient":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+        
+    def generate(self, prompt: str, system_prompt: str = None, **kwargs) -> str:
+        """Generate response from local LLM"""
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=30
-            )
+            return "".join(self.generate_stream(prompt, system_prompt, **kwargs))
+        except Exception as e:
+            logger.error("Error calling local LLM: %s", e)
+            return f"Error: Unable to generate response from LLM: {str(e)}"
+    
+    def generate_stream(self, prompt: str, system_prompt: str = None, **kwargs) -> Iterator[str]:
+        """Yield response fragments from local LLM as they are generated; raises on errors"""
+        payload = self._generate_payload(prompt, system_prompt, **kwargs)
+        payload["stream"] = True
+        
+        with self._session.post(
+            f"{self.base_url}/api/generate",
+            json=payload,
+            timeout=30,
+            stream=True
+        ) as response:
             response.raise_for_status()
-            return response.json()["response"]
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise Exception(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+    
+    async def agenerate(self, prompt: str, system_prompt: str = None, **kwargs) -> str:
+        """Generate response from local LLM without blocking the event loop"""
+        payload = self._generate_payload(prompt, system_prompt, **kwargs)
+        
+        try:
+            if self._batcher:
+                return await self._batcher.submit(payload)
+            return await self._apost_generate(payload)
         except Exception as e:
-            print(f"Error calling local LLM: {e}")
+            logger.error("Error calling local LLM: %s", e)
             return f"Error: Unable to generate response from LLM: {str(e)}"
     
+    async def _apost_generate(self, payload: Dict[str, Any]) -> str:
+        """Send generate request over the async client"""
+        response = await self._get_async_client().post("/api/generate", json=payload)
+        response.raise_for_status()
+        return response.json()["response"]
+    
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """Chat with local LLM using message history"""
         # Convert messages to Ollama format
@@ -53,7 +176,7 @@ class LocalLLMClient:
         }
         
         try:
-            response = requests.post(
+            response = self._session.post(
                 f"{self.base_url}/api/chat",
                 json=payload,
                 timeout=30
@@ -61,13 +184,47 @@ class LocalLLMClient:
             response.raise_for_status()
             return response.json()["message"]["content"]
         except Exception as e:
-            print(f"Error calling local LLM chat: {e}")
+            logger.error("Error calling local LLM chat: %s", e)
             return f"Error: Unable to chat with LLM: {str(e)}"
     
+    def embed(self, text: str) -> List[float]:
+        """Get embedding vector for text from local LLM"""
+        payload = {
+            "model": self.embedding_model,
+            "prompt": text
+        }
+        
+        try:
+            response = self._session.post(
+                f"{self.base_url}/api/embeddings",
+                json=payload,
+                timeout=30
+            )
+            response.raise_for_status()
+            return response.json()["embedding"]
+        except Exception as e:
+            logger.error("Error getting embedding from local LLM: %s", e)
+            return []
+    
+    async def aembed(self, text: str) -> List[float]:
+        """Get embedding vector for text without blocking the event loop"""
+        payload = {
+            "model": self.embedding_model,
+            "prompt": text
+        }
+        
+        try:
+            response = await self._get_async_client().post("/api/embeddings", json=payload)
+            response.raise_for_status()
+            return response.json()["embedding"]
+        except Exception as e:
+            logger.error("Error getting embedding from local LLM: %s", e)
+            return []
+    
     def is_available(self) -> bool:
         """Check if local LLM is available"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self._session.get(f"{self.base_url}/api/tags", timeout=5)
             return response.status_code == 200
         except:
             return False
@@ -75,7 +232,7 @@ class LocalLLMClient:
     def get_models(self) -> List[str]:
         """Get available models"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self._session.get(f"{self.base_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 models = response.json().get("models", [])
                 return [model["name"] for model in models]
@@ -7,39 +7,51 @@ It provides a comprehensive solution for analyzing microservice architectures,
 generating C4 diagrams, and helping with feature planning.
 """
 
+import argparse
 import asyncio
-import uvicorn
-from web_interface import app
-from config import settings
-from llm_client import LocalLLMClient
-from gitlab_client import gitlab_client
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+from typing import List
+# Project modules are imported inside the functions below: analysis pool
+# workers re-import this module as __mp_main__ and must not load the server
+
+logger = logging.getLogger(__name__)
 
 
 async def check_dependencies():
     """Check if all dependencies are available"""
-    print("Checking dependencies...")
+    from llm_client import LocalLLMClient
+    from gitlab_client import gitlab_client
+    
+    logger.info("Checking dependencies...")
     
     # Check LLM availability
     llm_client = LocalLLMClient()
     if llm_client.is_available():
         models = llm_client.get_models()
-        print(f"✅ Local LLM available. Models: {models}")
+        logger.info("✅ Local LLM available. Models: %s", models)
     else:
-        print("⚠️  Local LLM not available. Please ensure Ollama is running.")
+        logger.warning("⚠️  Local LLM not available. Please ensure Ollama is running.")
     
     # Check MCP server
     try:
         await gitlab_client.connect()
-        print("✅ MCP server connection successful")
+        logger.info("✅ MCP server connection successful")
         await gitlab_client.disconnect()
     except Exception as e:
-        print(f"⚠️  MCP server connection failed: {e}")
+        logger.warning("⚠️  MCP server connection failed: %s", e)
     
-    print("Dependency check complete.\n")
+    logger.info("Dependency check complete.")
 
 
 def print_startup_info():
     """Print startup information"""
+    from config import settings
+    
     print("=" * 60)
     print("🏗️  Architecture Agent")
     print("=" * 60)
@@ -52,22 +64,86 @@ def print_startup_info():
     print()
 
 
-def main():
+def _supports_io_uring() -> bool:
+    """Check for Linux 5.11+, the first kernel with io_uring usable for sockets"""
+    if platform.system() != "Linux":
+        return False
+    try:
+        major, minor = (int(part) for part in os.uname().release.split(".")[:2])
+    except ValueError:
+        return False
+    return (major, minor) >= (5, 11)
+
+
+def _exec_granian():
+    """Replace this process with granian serving the same ASGI app"""
+    from config import settings
+    
+    # One worker: agents and websocket connections live in process memory
+    os.execvp("granian", [
+        "granian",
+        "--interface", "asgi",
+        "--host", settings.host,
+        "--port", str(settings.port),
+        "--loop", "uvloop",
+        "--workers", "1",
+        "web_interface:app"
+    ])
+
+
+def main(argv: List[str] = None):
     """Main application entry point"""
+    import uvicorn
+    from config import settings
+    from web_interface import app
+    
+    parser = argparse.ArgumentParser(description="Architecture Agent")
+    parser.add_argument(
+        "--uring",
+        action="store_true",
+        help="serve with granian on Linux 5.11+ (io_uring-capable kernels), falling back to uvicorn"
+    )
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
     print_startup_info()
     
     # Check dependencies
     asyncio.run(check_dependencies())
     
     # Start the web server
-    print("Starting Architecture Agent...")
-    uvicorn.run(
+    logger.info("Starting Architecture Agent...")
+    if args.uring:
+        if not _supports_io_uring():
+            logger.warning("--uring needs Linux 5.11 or newer; using uvicorn")
+        elif not shutil.which("granian"):
+            logger.warning("--uring needs granian installed; using uvicorn")
+        else:
+            _exec_granian()
+    
+    config = uvicorn.Config(
         app,
         host=settings.host,
         port=settings.port,
-        log_level="info"
+        log_level="info",
+        # uvloop has no Windows build
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws="websockets",
+        # Negotiate permessage-deflate so large diagram frames are compressed
+        ws_per_message_deflate=True,
+        # Deeper accept queue for connection bursts (capped by net.core.somaxconn)
+        backlog=4096,
+        # Keep idle HTTP connections open between the UI's polls
+        timeout_keep_alive=75
     )
+    uvicorn.Server(config).run()
 
 
 if __name__ == "__main__":
+    # Needed for the analysis process pool in frozen Windows executables
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -1,5 +1,5 @@
 from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from enum import Enum
 
@@ -18,6 +18,8 @@ class C4Level(str, Enum):
 
 
 class Message(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     id: str
     agent_id: str
     content: str
@@ -44,10 +46,10 @@ class C4Element(BaseModel):
     level: C4Level
     description: str
     technology: Optional[str] = None
-    relationships: List[str] = []
-    properties: Dict[str, Any] = {}
+    relationships: List[str] = Field(default_factory=list)
+    properties: Dict[str, Any] = Field(default_factory=dict)
     parent_id: Optional[str] = None
-    children: List[str] = []
+    children: List[str] = Field(default_factory=list)
 
 
 class C4Diagram(BaseModel):
@@ -61,6 +63,8 @@ class C4Diagram(BaseModel):
 
 
 class Repository(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     id: str
     name: str
     url: str
@@ -72,8 +76,14 @@ class Repository(BaseModel):
 
 
 class AnalysisResult(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     agent_id: str
     repository_id: str
     analysis_type: str
     result: Dict[str, Any]
-    timestamp: datetime
\ No newline at end of file
+    timestamp: datetime
+
+
+class CreateAgentRequest(BaseModel):
+    name: str
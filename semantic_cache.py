@@ -0,0 +1,197 @@
+import numpy as np
+import xxhash
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Hashable, Callable, Awaitable
+from llm_client import LocalLLMClient
+from config import settings
+
+
+async def _embed_unit(llm_client: LocalLLMClient, text: str) -> Optional[np.ndarray]:
+    """Embed text as a unit vector, or None if no embedding is available"""
+    vector = np.asarray(await llm_client.aembed(text), dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if vector.ndim != 1 or not norm:
+        return None
+    return vector / norm
+
+
+class SemanticLLMCache:
+    """Embedding-keyed response cache in front of LocalLLMClient.agenerate"""
+
+    def __init__(self, llm_client: LocalLLMClient, threshold: float = None, max_entries: int = None):
+        self.llm_client = llm_client
+        self.threshold = threshold if threshold is not None else settings.semantic_cache_threshold
+        self.max_entries = max_entries or settings.semantic_cache_size
+        # namespace -> {"vectors": ndarray (n, dim), "prompts": [...], "responses": [...]}
+        self._entries: Dict[Hashable, Dict[str, Any]] = {}
+        # namespace -> {xxh3_64(prompt): response}, checked before embedding
+        self._exact: Dict[Hashable, "OrderedDict[int, str]"] = {}
+
+    async def agenerate(self, prompt: str, namespace: Hashable, cache_key: str = None,
+                 system_prompt: str = None, use_cache: bool = True, semantic: bool = True,
+                 **kwargs) -> str:
+        """Generate response, reusing a cached one for semantically equal requests
+
+        Entries are isolated per namespace (e.g. (agent_id, node_name)).
+        cache_key is the text that gets embedded; it defaults to the prompt,
+        but callers with a large static template should pass only the
+        variable part so the template does not dominate the similarity.
+        With use_cache=False the cache is bypassed for both lookup and store;
+        with semantic=False only exact prompt repeats are served from it.
+        """
+        if not use_cache:
+            return await self.llm_client.agenerate(prompt, system_prompt, **kwargs)
+
+        # Exact repeats skip the embedding call and vector search entirely
+        prompt_hash = xxhash.xxh3_64_intdigest(prompt.encode("utf-8"))
+        exact = self._exact.get(namespace)
+        if exact is not None and prompt_hash in exact:
+            return exact[prompt_hash]
+
+        embedding = None
+        if semantic:
+            embedding = await _embed_unit(self.llm_client, cache_key if cache_key is not None else prompt)
+
+        if embedding is not None:
+            cached = self._lookup(namespace, embedding)
+            if cached is not None:
+                return cached
+
+        response = await self.llm_client.agenerate(prompt, system_prompt, **kwargs)
+
+        # Do not cache failed generations
+        if not response.startswith("Error:"):
+            self._store_exact(namespace, prompt_hash, response)
+            if embedding is not None:
+                self._store(namespace, embedding, prompt, response)
+
+        return response
+
+    def clear(self, namespace: Hashable = None):
+        """Clear cached entries for namespace, or everything"""
+        if namespace is None:
+            self._entries.clear()
+            self._exact.clear()
+        else:
+            self._entries.pop(namespace, None)
+            self._exact.pop(namespace, None)
+
+    def _store_exact(self, namespace: Hashable, prompt_hash: int, response: str):
+        """Store response under the prompt hash, evicting the oldest entry"""
+        exact = self._exact.setdefault(namespace, OrderedDict())
+        exact[prompt_hash] = response
+        if len(exact) > self.max_entries:
+            exact.popitem(last=False)
+
+    def _lookup(self, namespace: Hashable, embedding: np.ndarray) -> Optional[str]:
+        """Return cached response of the nearest neighbour above threshold"""
+        entries = self._entries.get(namespace)
+        if not entries or entries["vectors"].shape[1] != embedding.shape[0]:
+            return None
+
+        similarities = entries["vectors"] @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.threshold:
+            return entries["responses"][best]
+        return None
+
+    def _store(self, namespace: Hashable, embedding: np.ndarray, prompt: str, response: str):
+        """Store embedding and response, evicting the oldest entries"""
+        entries = self._entries.get(namespace)
+        if not entries or entries["vectors"].shape[1] != embedding.shape[0]:
+            entries = {
+                "vectors": np.empty((0, embedding.shape[0]), dtype=np.float32),
+                "prompts": [],
+                "responses": []
+            }
+            self._entries[namespace] = entries
+
+        entries["vectors"] = np.vstack([entries["vectors"], embedding])[-self.max_entries:]
+        entries["prompts"] = (entries["prompts"] + [prompt])[-self.max_entries:]
+        entries["responses"] = (entries["responses"] + [response])[-self.max_entries:]
+
+
+class LSHIndex:
+    """Random-projection LSH over unit vectors with exact cosine verification"""
+
+    def __init__(self, dim: int, num_tables: int = None, num_bits: int = None,
+                 max_entries: int = None, seed: int = 0):
+        self.dim = dim
+        self.num_tables = num_tables or settings.lsh_num_tables
+        self.num_bits = num_bits or settings.lsh_num_bits
+        self.max_entries = max_entries or settings.semantic_cache_size
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((self.num_tables * self.num_bits, dim)).astype(np.float32)
+        self._weights = 1 << np.arange(self.num_bits, dtype=np.int64)
+        self._tables: List[Dict[int, set]] = [{} for _ in range(self.num_tables)]
+        # entry id -> (vector, signatures, value), oldest first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+
+    def _signatures(self, vector: np.ndarray) -> List[int]:
+        """One bucket key per table from the signs of the projections"""
+        bits = (self._planes @ vector > 0).reshape(self.num_tables, self.num_bits)
+        return (bits @ self._weights).tolist()
+
+    def query(self, vector: np.ndarray, threshold: float) -> Optional[Any]:
+        """Return the value of the most similar stored vector above threshold"""
+        candidates = set()
+        for table, signature in zip(self._tables, self._signatures(vector)):
+            candidates.update(table.get(signature, ()))
+
+        best_value, best_similarity = None, threshold
+        for entry_id in candidates:
+            candidate, _, value = self._entries[entry_id]
+            similarity = float(candidate @ vector)
+            if similarity >= best_similarity:
+                best_value, best_similarity = value, similarity
+        return best_value
+
+    def insert(self, vector: np.ndarray, value: Any):
+        """Store value under vector, evicting the oldest entry when full"""
+        if len(self._entries) >= self.max_entries:
+            old_id, (_, old_signatures, _) = self._entries.popitem(last=False)
+            for table, signature in zip(self._tables, old_signatures):
+                bucket = table.get(signature)
+                if bucket is not None:
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del table[signature]
+
+        entry_id = self._next_id
+        self._next_id += 1
+        signatures = self._signatures(vector)
+        self._entries[entry_id] = (vector, signatures, value)
+        for table, signature in zip(self._tables, signatures):
+            table.setdefault(signature, set()).add(entry_id)
+
+
+class SemanticSearchCache:
+    """LSH-backed semantic cache for search results, isolated per namespace"""
+
+    def __init__(self, llm_client: LocalLLMClient, threshold: float = None):
+        self.llm_client = llm_client
+        self.threshold = threshold if threshold is not None else settings.semantic_cache_threshold
+        self._indexes: Dict[Hashable, LSHIndex] = {}
+
+    async def search(self, namespace: Hashable, query: str,
+                     search: Callable[[], Awaitable[List[Any]]]) -> List[Any]:
+        """Return cached results for a similar query, otherwise run search()"""
+        embedding = await _embed_unit(self.llm_client, query)
+        index = self._indexes.get(namespace)
+
+        if embedding is not None and index is not None and index.dim == embedding.shape[0]:
+            cached = index.query(embedding, self.threshold)
+            if cached is not None:
+                return cached
+
+        results = await search()
+
+        # Empty results are also what failed searches return, so never cache them
+        if embedding is not None and results:
+            if index is None or index.dim != embedding.shape[0]:
+                index = LSHIndex(embedding.shape[0])
+                self._indexes[namespace] = index
+            index.insert(embedding, results)
+
+        return results
@@ -1,23 +1,55 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, HTTPException, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
-import json
-import uuid
-from typing import Dict, List
+from fastapi.middleware.gzip import GZipMiddleware
+import orjson
+import msgspec
+import numpy as np
+import hashlib
+import os
+import secrets
+from typing import Dict, List, Set, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
+from pathlib import Path
 
 from agent_manager import agent_manager
-from models import Message
+from code_analyzer import shutdown_cpu_pool
+from gitlab_client import gitlab_client
+from models import Message, CreateAgentRequest
 from config import settings
 
 
 app = FastAPI(title="Architecture Agent", version="1.0.0")
+STATIC_DIR = Path(__file__).parent / "static"
+
+# Compress JSON API responses and static assets; Plotly payloads compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+class _ApiCORSMiddleware:
+    """CORSMiddleware applied to /api/ HTTP requests only
+    
+    The page is served from the same origin and websockets ignore CORS, so
+    everything else skips the origin and preflight handling.
+    """
+    
+    def __init__(self, app, **options):
+        self.app = app
+        self.cors = CORSMiddleware(app, **options)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/api/"):
+            await self.cors(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
 
 # CORS middleware
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
+    _ApiCORSMiddleware,
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -27,405 +59,183 @@ app.add_middleware(
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
-        self.agent_connections: Dict[str, List[str]] = {}  # agent_id -> connection_ids
+        self.agent_connections: Dict[str, Set[str]] = {}  # agent_id -> connection_ids
+        self.conn_to_agent: Dict[str, str] = {}  # connection_id -> agent_id
+        # connection_id -> (diagram_id, version) of the diagram the client shows
+        self.last_diagram: Dict[str, Tuple[str, int]] = {}
+        # connection_id -> JSON messages waiting to be written as one frame
+        self.pending: Dict[str, List[bytes]] = {}
+        self._flush_events: Dict[str, asyncio.Event] = {}
+        self._flushers: Dict[str, asyncio.Task] = {}
     
     async def connect(self, websocket: WebSocket, agent_id: str):
         await websocket.accept()
-        connection_id = str(uuid.uuid4())
+        connection_id = secrets.token_hex(16)
         self.active_connections[connection_id] = websocket
-        
-        if agent_id not in self.agent_connections:
-            self.agent_connections[agent_id] = []
-        self.agent_connections[agent_id].append(connection_id)
+        self.conn_to_agent[connection_id] = agent_id
+        self.agent_connections.setdefault(agent_id, set()).add(connection_id)
+        self._flush_events[connection_id] = asyncio.Event()
+        self._flushers[connection_id] = asyncio.create_task(self._flush_loop(connection_id))
         
         return connection_id
     
     def disconnect(self, connection_id: str):
-        if connection_id in self.active_connections:
-            del self.active_connections[connection_id]
+        self.active_connections.pop(connection_id, None)
+        self.last_diagram.pop(connection_id, None)
+        self.pending.pop(connection_id, None)
+        self._flush_events.pop(connection_id, None)
+        flusher = self._flushers.pop(connection_id, None)
+        if flusher is not None and flusher is not asyncio.current_task():
+            flusher.cancel()
         
         # Remove from agent connections
-        for agent_id, connections in self.agent_connections.items():
-            if connection_id in connections:
-                connections.remove(connection_id)
-                if not connections:
-                    del self.agent_connections[agent_id]
+        agent_id = self.conn_to_agent.pop(connection_id, None)
+        connections = self.agent_connections.get(agent_id)
+        if connections is not None:
+            connections.discard(connection_id)
+            if not connections:
+                del self.agent_connections[agent_id]
     
     async def send_personal_message(self, message: str, connection_id: str):
-        if connection_id in self.active_connections:
-            await self.active_connections[connection_id].send_text(message)
+        self._enqueue(message.encode("utf-8"), connection_id)
+    
+    async def send_personal_bytes(self, message: bytes, connection_id: str):
+        self._enqueue(message, connection_id)
     
     async def broadcast_to_agent(self, message: str, agent_id: str):
-        if agent_id in self.agent_connections:
-            for connection_id in self.agent_connections[agent_id]:
-                await self.send_personal_message(message, connection_id)
-
-
-manager = ConnectionManager()
-
-
-@app.get("/")
-async def get_index():
-    """Serve the main HTML page"""
-    html_content = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Architecture Agent</title>
-        <meta charset="utf-8">
-        <style>
-            body {
-                font-family: Arial, sans-serif;
-                margin: 0;
-                padding: 20px;
-                background-color: #f5f5f5;
-            }
-            .container {
-                max-width: 1200px;
-                margin: 0 auto;
-                display: grid;
-                grid-template-columns: 300px 1fr;
-                gap: 20px;
-                height: 90vh;
-            }
-            .sidebar {
-                background: white;
-                border-radius: 8px;
-                padding: 20px;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }
-            .main-content {
-                background: white;
-                border-radius: 8px;
-                padding: 20px;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                display: flex;
-                flex-direction: column;
-            }
-            .chat-container {
-                flex: 1;
-                display: flex;
-                flex-direction: column;
-                border: 1px solid #ddd;
-                border-radius: 4px;
-            }
-            .chat-messages {
-                flex: 1;
-                overflow-y: auto;
-                padding: 10px;
-                background: #fafafa;
-            }
-            .message {
-                margin: 10px 0;
-                padding: 10px;
-                border-radius: 8px;
-                max-width: 80%;
-            }
-            .user-message {
-                background: #007bff;
-                color: white;
-                margin-left: auto;
-            }
-            .agent-message {
-                background: #e9ecef;
-                color: #333;
-            }
-            .chat-input {
-                display: flex;
-                padding: 10px;
-                border-top: 1px solid #ddd;
-            }
-            .chat-input input {
-                flex: 1;
-                padding: 10px;
-                border: 1px solid #ddd;
-                border-radius: 4px;
-                margin-right: 10px;
-            }
-            .chat-input button {
-                padding: 10px 20px;
-                background: #007bff;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                cursor: pointer;
-            }
-            .chat-input button:hover {
-                background: #0056b3;
-            }
-            .agent-list {
-                margin-bottom: 20px;
-            }
-            .agent-item {
-                padding: 10px;
-                margin: 5px 0;
-                border: 1px solid #ddd;
-                border-radius: 4px;
-                cursor: pointer;
-                background: #f8f9fa;
-            }
-            .agent-item:hover {
-                background: #e9ecef;
-            }
-            .agent-item.active {
-                background: #007bff;
-                color: white;
-            }
-            .create-agent {
-                margin-bottom: 20px;
-            }
-            .create-agent input {
-                width: 100%;
-                padding: 8px;
-                margin-bottom: 10px;
-                border: 1px solid #ddd;
-                border-radius: 4px;
-            }
-            .create-agent button {
-                width: 100%;
-                padding: 10px;
-                background: #28a745;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                cursor: pointer;
-            }
-            .create-agent button:hover {
-                background: #218838;
-            }
-            .diagram-container {
-                margin-top: 20px;
-                border: 1px solid #ddd;
-                border-radius: 4px;
-                padding: 10px;
-                min-height: 400px;
-            }
-            .status-indicator {
-                display: inline-block;
-                width: 10px;
-                height: 10px;
-                border-radius: 50%;
-                margin-right: 5px;
-            }
-            .status-idle { background: #28a745; }
-            .status-busy { background: #ffc107; }
-            .status-error { background: #dc3545; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="sidebar">
-                <h2>Agents</h2>
-                <div class="create-agent">
-                    <input type="text" id="agentName" placeholder="Agent name">
-                    <button onclick="createAgent()">Create Agent</button>
-                </div>
-                <div class="agent-list" id="agentList">
-                    <!-- Agents will be loaded here -->
-                </div>
-            </div>
-            <div class="main-content">
-                <div class="chat-container">
-                    <div class="chat-messages" id="chatMessages">
-                        <div class="message agent-message">
-                            Welcome! Create an agent to start analyzing your architecture.
-                        </div>
-                    </div>
-                    <div class="chat-input">
-                        <input type="text" id="messageInput" placeholder="Type your message..." onkeypress="handleKeyPress(event)">
-                        <button onclick="sendMessage()">Send</button>
-                    </div>
-                </div>
-                <div class="diagram-container" id="diagramContainer">
-                    <h3>C4 Architecture Diagram</h3>
-                    <div id="diagramContent">
-                        <!-- Diagrams will be rendered here -->
-                    </div>
-                </div>
-            </div>
-        </div>
-
-        <script>
-            let currentAgentId = null;
-            let ws = null;
-
-            // Load agents on page load
-            window.onload = function() {
-                loadAgents();
-            };
-
-            async function loadAgents() {
-                try {
-                    const response = await fetch('/api/agents');
-                    const agents = await response.json();
-                    displayAgents(agents);
-                } catch (error) {
-                    console.error('Error loading agents:', error);
-                }
-            }
-
-            function displayAgents(agents) {
-                const agentList = document.getElementById('agentList');
-                agentList.innerHTML = '';
-                
-                agents.forEach(agent => {
-                    const agentItem = document.createElement('div');
-                    agentItem.className = 'agent-item';
-                    agentItem.innerHTML = `
-                        <span class="status-indicator status-${agent.status}"></span>
-                        ${agent.name}
-                    `;
-                    agentItem.onclick = () => selectAgent(agent.id);
-                    agentList.appendChild(agentItem);
-                });
-            }
-
-            async function createAgent() {
-                const nameInput = document.getElementById('agentName');
-                const name = nameInput.value.trim();
-                
-                if (!name) {
-                    alert('Please enter an agent name');
-                    return;
-                }
-
-                try {
-                    const response = await fetch('/api/agents', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify({ name: name })
-                    });
-                    
-                    if (response.ok) {
-                        const result = await response.json();
-                        nameInput.value = '';
-                        loadAgents();
-                        selectAgent(result.agent_id);
-                    } else {
-                        alert('Error creating agent');
-                    }
-                } catch (error) {
-                    console.error('Error creating agent:', error);
-                    alert('Error creating agent');
-                }
-            }
-
-            function selectAgent(agentId) {
-                currentAgentId = agentId;
-                
-                // Update UI
-                document.querySelectorAll('.agent-item').forEach(item => {
-                    item.classList.remove('active');
-                });
-                event.target.closest('.agent-item').classList.add('active');
-                
-                // Clear chat
-                document.getElementById('chatMessages').innerHTML = '';
-                
-                // Connect WebSocket
-                connectWebSocket(agentId);
-            }
-
-            function connectWebSocket(agentId) {
-                if (ws) {
-                    ws.close();
-                }
-                
-                ws = new WebSocket(`ws://localhost:8000/ws/${agentId}`);
-                
-                ws.onopen = function() {
-                    console.log('WebSocket connected');
-                };
-                
-                ws.onmessage = function(event) {
-                    const data = JSON.parse(event.data);
-                    displayMessage(data.message, data.role);
-                    
-                    if (data.diagram) {
-                        displayDiagram(data.diagram);
-                    }
-                };
-                
-                ws.onclose = function() {
-                    console.log('WebSocket disconnected');
-                };
-            }
-
-            function sendMessage() {
-                const input = document.getElementById('messageInput');
-                const message = input.value.trim();
-                
-                if (!message || !currentAgentId) return;
-                
-                if (ws && ws.readyState === WebSocket.OPEN) {
-                    ws.send(JSON.stringify({ message: message }));
-                    displayMessage(message, 'user');
-                    input.value = '';
-                }
-            }
-
-            function handleKeyPress(event) {
-                if (event.key === 'Enter') {
-                    sendMessage();
-                }
-            }
-
-            function displayMessage(message, role) {
-                const chatMessages = document.getElementById('chatMessages');
-                const messageDiv = document.createElement('div');
-                messageDiv.className = `message ${role}-message`;
-                messageDiv.textContent = message;
-                chatMessages.appendChild(messageDiv);
-                chatMessages.scrollTop = chatMessages.scrollHeight;
-            }
-
-            function displayDiagram(diagramData) {
-                const diagramContent = document.getElementById('diagramContent');
-                
-                if (diagramData.type === 'plotly') {
-                    // Render Plotly diagram
-                    Plotly.newPlot('diagramContent', diagramData.data);
-                } else {
-                    // Display diagram info
-                    diagramContent.innerHTML = `
-                        <h4>${diagramData.name}</h4>
-                        <p>Level: ${diagramData.level}</p>
-                        <p>Elements: ${diagramData.elements?.length || 0}</p>
-                    `;
-                }
-            }
-        </script>
-        <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-    </body>
-    </html>
+        # Queuing never blocks, so a slow client cannot hold up the others
+        encoded = message.encode("utf-8")
+        for connection_id in self.agent_connections.get(agent_id, ()):
+            self._enqueue(encoded, connection_id)
+    
+    def _enqueue(self, message: bytes, connection_id: str):
+        """Queue one JSON message for the connection's next frame"""
+        event = self._flush_events.get(connection_id)
+        if event is None:
+            return
+        self.pending.setdefault(connection_id, []).append(message)
+        event.set()
+    
+    async def _flush_loop(self, connection_id: str):
+        """Write queued messages as a single JSON array frame per flush interval"""
+        websocket = self.active_connections[connection_id]
+        event = self._flush_events[connection_id]
+        try:
+            while True:
+                await event.wait()
+                # Let a burst of messages accumulate before writing
+                await asyncio.sleep(settings.ws_flush_interval_ms / 1000)
+                event.clear()
+                batch = self.pending.pop(connection_id, None)
+                if batch:
+                    await websocket.send_bytes(b"[" + b",".join(batch) + b"]")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(connection_id)
+
+
+class ShardedConnectionManager:
+    """Connection state split by agent into independent ConnectionManager shards
+    
+    All connections of an agent live in one shard, so a broadcast or a
+    disconnect only ever touches that shard's dicts.
     """
-    return HTMLResponse(content=html_content)
+    
+    def __init__(self, num_shards: int = 16):
+        self.shards = [ConnectionManager() for _ in range(num_shards)]
+    
+    def shard_for(self, agent_id: str) -> ConnectionManager:
+        """Shard holding the connections of agent_id"""
+        digest = hashlib.blake2b(agent_id.encode("utf-8"), digest_size=8).digest()
+        return self.shards[int.from_bytes(digest, "little") % len(self.shards)]
+    
+    async def connect(self, websocket: WebSocket, agent_id: str) -> str:
+        return await self.shard_for(agent_id).connect(websocket, agent_id)
+    
+    def disconnect(self, connection_id: str, agent_id: str):
+        self.shard_for(agent_id).disconnect(connection_id)
+    
+    async def broadcast_to_agent(self, message: str, agent_id: str):
+        await self.shard_for(agent_id).broadcast_to_agent(message, agent_id)
+
+
+manager = ShardedConnectionManager()
+
+
+@app.on_event("startup")
+async def connect_mcp():
+    """Open the MCP connection once instead of on every tool call"""
+    await gitlab_client.ensure_connected()
+
+
+@app.on_event("shutdown")
+async def disconnect_mcp():
+    """Close the MCP connection"""
+    await gitlab_client.disconnect()
+
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    """Close the shared LLM client's pooled connections"""
+    await agent_manager.llm_client.aclose()
+
+
+@app.on_event("shutdown")
+async def stop_analysis_workers():
+    """Stop the code analysis process pool"""
+    shutdown_cpu_pool()
+
+
+@app.on_event("startup")
+async def start_idle_sweeper():
+    """Start evicting agents that have been idle too long"""
+    app.state.idle_sweeper = asyncio.create_task(agent_manager.run_idle_sweeper())
+
+
+# Per-process prefix so a restarted server never matches a stale client ETag
+_AGENTS_ETAG_PREFIX = secrets.token_hex(4)
+_agents_cache: Tuple[int, bytes] = (-1, b"")
 
 
 @app.get("/api/agents")
-async def list_agents():
+async def list_agents(request: Request):
     """List all agents"""
-    return agent_manager.list_agents()
+    global _agents_cache
+    version = agent_manager.version
+    etag = f'"{_AGENTS_ETAG_PREFIX}-{version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    if _agents_cache[0] != version:
+        _agents_cache = (version, orjson.dumps(agent_manager.list_agents()))
+    return Response(content=_agents_cache[1], media_type="application/json", headers={"ETag": etag})
 
 
 @app.post("/api/agents")
-async def create_agent(request: dict):
+async def create_agent(request: CreateAgentRequest):
     """Create new agent"""
     try:
-        agent_id = agent_manager.create_agent(request["name"])
-        return {"agent_id": agent_id, "name": request["name"]}
+        agent_id = agent_manager.create_agent(request.name)
+        return {"agent_id": agent_id, "name": request.name}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# Shared 404 reply; cheaper than raising HTTPException on stale-client polls
+_NOT_FOUND = Response(
+    status_code=404,
+    content=b'{"detail":"Agent not found"}',
+    media_type="application/json"
+)
+
+
 @app.delete("/api/agents/{agent_id}")
 async def delete_agent(agent_id: str):
     """Delete agent"""
     success = agent_manager.delete_agent(agent_id)
     if not success:
-        raise HTTPException(status_code=404, detail="Agent not found")
+        return _NOT_FOUND
     return {"message": "Agent deleted"}
 
 
@@ -434,29 +244,132 @@ async def get_agent_context(agent_id: str):
     """Get agent context"""
     agent = agent_manager.get_agent(agent_id)
     if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
+        return _NOT_FOUND
     return agent.get_context()
 
 
+# (diagram id, diagram version) -> serialized diagram frame, oldest first
+_DIAGRAM_CACHE: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+_DIAGRAM_CACHE_SIZE = 64
+# Figure building is CPU-bound; keep it off the event loop thread
+_PLOTLY_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+
+
+class _ChatMessage(msgspec.Struct):
+    """Outgoing chat frame"""
+    message: str
+    role: str = "assistant"
+
+
+class _DiagramPayload(msgspec.Struct):
+    """Plotly figure plus the metadata the page shows next to it"""
+    data: dict
+    name: str
+    level: str
+    elements: List[str]
+    type: str = "plotly"
+
+
+class _DiagramFrame(msgspec.Struct):
+    """Outgoing diagram frame"""
+    diagram: _DiagramPayload
+
+
+def _encode_numpy(obj):
+    """msgspec enc_hook for the numpy arrays and scalars in Plotly figures"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise NotImplementedError(f"Cannot encode {type(obj).__name__}")
+
+
+class _IncomingMessage(msgspec.Struct):
+    message: str
+
+
+# Decodes chat frames straight into a typed struct; ValidationError is a DecodeError
+_INCOMING_DECODER = msgspec.json.Decoder(_IncomingMessage)
+_ENCODER = msgspec.json.Encoder(enc_hook=_encode_numpy)
+
+
+def _render_diagram_frame(c4_generator, diagram) -> bytes:
+    """Build and serialize the Plotly diagram frame; runs on _PLOTLY_POOL"""
+    fig = c4_generator.generate_plotly_diagram(diagram.id)
+    return _ENCODER.encode(_DiagramFrame(diagram=_DiagramPayload(
+        data=fig.to_dict(),
+        name=diagram.name,
+        level=diagram.level.value,
+        elements=c4_generator.element_names(diagram.id)
+    )))
+
+
+async def _diagram_frame(agent, diagram) -> bytes:
+    """Serialized Plotly diagram frame, rebuilt off the event loop only when the diagram changes"""
+    async with agent.diagram_lock:
+        key = (diagram.id, agent.c4_generator.diagram_version(diagram.id))
+        frame = _DIAGRAM_CACHE.get(key)
+        if frame is None:
+            loop = asyncio.get_running_loop()
+            frame = await loop.run_in_executor(_PLOTLY_POOL, _render_diagram_frame, agent.c4_generator, diagram)
+            _DIAGRAM_CACHE[key] = frame
+            if len(_DIAGRAM_CACHE) > _DIAGRAM_CACHE_SIZE:
+                _DIAGRAM_CACHE.popitem(last=False)
+    return frame
+
+
+async def _incoming_frames(websocket: WebSocket):
+    """Yield inbound frame payloads until the client disconnects
+    
+    The page sends binary frames, which skip the UTF-8 decode of text frames;
+    text frames are only accepted with settings.ws_accept_text_frames and
+    otherwise close the socket with 1003 (unsupported data).
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        raw = message.get("bytes")
+        if raw is None:
+            if not settings.ws_accept_text_frames:
+                await websocket.close(code=1003, reason="Send messages as binary frames")
+                return
+            raw = message["text"]
+        yield raw
+
+
 @app.websocket("/ws/{agent_id}")
 async def websocket_endpoint(websocket: WebSocket, agent_id: str):
     """WebSocket endpoint for chat with agent"""
     connection_id = await manager.connect(websocket, agent_id)
+    shard = manager.shard_for(agent_id)
+    agent_manager.attach_connection(agent_id)
     
     try:
-        while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+        async for data in _incoming_frames(websocket):
+            try:
+                incoming = _INCOMING_DECODER.decode(data)
+            except msgspec.DecodeError as e:
+                await shard.send_personal_bytes(
+                    _ENCODER.encode(_ChatMessage(message=f"Invalid message: {e}", role="system")),
+                    connection_id
+                )
+                continue
             
             # Process message with agent
-            response = await agent_manager.process_message(agent_id, message_data["message"])
+            try:
+                response = await agent_manager.process_message(agent_id, incoming.message)
+            except ValueError as e:
+                # The agent was deleted while this socket stayed open
+                await shard.send_personal_bytes(
+                    _ENCODER.encode(_ChatMessage(message=str(e), role="system")),
+                    connection_id
+                )
+                continue
             
             # Send response back
-            await manager.send_personal_message(
-                json.dumps({
-                    "message": response,
-                    "role": "assistant"
-                }),
+            await shard.send_personal_bytes(
+                _ENCODER.encode(_ChatMessage(message=response)),
                 connection_id
             )
             
@@ -465,24 +378,19 @@ async def websocket_endpoint(websocket: WebSocket, agent_id: str):
             if agent and agent.context.get("current_diagram"):
                 diagram_id = agent.context["current_diagram"]
                 diagram = agent.c4_generator.diagrams.get(diagram_id)
-                if diagram:
-                    # Generate Plotly diagram
-                    fig = agent.c4_generator.generate_plotly_diagram(diagram_id)
-                    await manager.send_personal_message(
-                        json.dumps({
-                            "diagram": {
-                                "type": "plotly",
-                                "data": fig.to_dict(),
-                                "name": diagram.name,
-                                "level": diagram.level.value,
-                                "elements": [e.name for e in diagram.elements]
-                            }
-                        }),
+                version = agent.c4_generator.diagram_version(diagram_id)
+                # The page shows only the last diagram it received, so skip the
+                # frame only when that is this very diagram and version
+                if diagram and shard.last_diagram.get(connection_id) != (diagram_id, version):
+                    await shard.send_personal_bytes(
+                        await _diagram_frame(agent, diagram),
                         connection_id
                     )
+                    shard.last_diagram[connection_id] = (diagram_id, version)
     
-    except WebSocketDisconnect:
-        manager.disconnect(connection_id)
+    finally:
+        agent_manager.detach_connection(agent_id)
+        manager.disconnect(connection_id, agent_id)
 
 
 @app.get("/api/diagrams/{diagram_id}")
@@ -500,6 +408,11 @@ async def highlight_diagram_elements(diagram_id: str, element_ids: List[str]):
     return {"message": "Highlight endpoint not implemented yet"}
 
 
+# Mounted last: a mount at "/" would otherwise shadow the routes declared after it
+app.mount("/", StaticFiles(directory=STATIC_DIR, html=True), name="static")
+
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host=settings.host, port=settings.port)
\ No newline at end of file
+    # Same server configuration as the main entry point
+    from main import main
+    main()
\ No newline at end of file